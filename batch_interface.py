@@ -0,0 +1,207 @@
+"""
+Runs `interface.zone_and_analyze` for many communities at once
+
+Give it a directory with the basic shapefile (zipped, like
+`community.zip`) of each community, named after the community as in
+`resources/community_info.csv` (case and spacing don't matter, so
+`north_reading.zip` is North Reading). Each community runs in its own
+process, with its own scratch directory for R, and the biggest
+shapefiles are started first so that one big community doesn't get left
+running at the end on its own
+
+Run from the top of the repo:
+    python batch_interface.py shapefiles/ --workers 4 --zoner python
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import zipfile
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import interface
+
+COMMUNITY_INFO_PATH = "./resources/community_info.csv"
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def find_shapefiles(shapefile_dir):
+    """
+    Returns `{community: path}` for the zipped shapefiles in
+    `shapefile_dir` that are named after one of the MBTA communities
+
+    Fails if a zip file isn't named after one of them
+    """
+    communities = {
+        _normalize(name): name for name in pd.read_csv(COMMUNITY_INFO_PATH)["Community"]
+    }
+
+    shapefiles = {}
+    for file_name in sorted(os.listdir(shapefile_dir)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() != ".zip":
+            continue
+        if _normalize(stem) not in communities:
+            raise Exception(f"`{file_name}` isn't named after an MBTA community")
+        shapefiles[communities[_normalize(stem)]] = os.path.join(
+            shapefile_dir, file_name
+        )
+    return shapefiles
+
+
+def shapefile_size(path):
+    """
+    How big the zipped shapefile at `path` is, by the size of its `.dbf`
+    (one record per parcel), without extracting anything
+    """
+    with zipfile.ZipFile(path, "r") as zip_ref:
+        return sum(
+            info.file_size
+            for info in zip_ref.infolist()
+            if info.filename.lower().endswith(".dbf")
+        )
+
+
+def _run_community(community, path_to_shp, scratch_root, kwargs):
+    """
+    `zone_and_analyze` for one community, in a new scratch directory
+    under `scratch_root` that is removed afterwards. Saves the zonings
+    and results like `interface.py` does, and returns the community's
+    row of the results table. Errors end up in the table instead of
+    stopping the other communities
+    """
+    start = time.perf_counter()
+    row = {"community": community, "shapefile": path_to_shp}
+
+    work_dir = tempfile.mkdtemp(prefix=f"{_normalize(community)}_", dir=scratch_root)
+    try:
+        zonings, results = interface.zone_and_analyze(
+            community, path_to_shp, work_dir=work_dir, **kwargs
+        )
+
+        with open(f"out/{community}_zonings.json", "w") as f:
+            json.dump(zonings, f)
+        with open(f"out/{community}_results.json", "w") as f:
+            json.dump(results, f)
+
+        row["zonings"] = len(results)
+        row["passed"] = sum(results)
+        row["error"] = None
+    except Exception as e:
+        row["zonings"] = row["passed"] = 0
+        row["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def run_communities(
+    shapefile_dir,
+    communities=None,
+    workers=1,
+    scratch_root=None,
+    results_path="out/communities.csv",
+    **kwargs,
+):
+    """
+    Runs `zone_and_analyze` for every community with a shapefile in
+    `shapefile_dir` (or just `communities`), `workers` communities at a
+    time, biggest first. Other keyword arguments are passed on to
+    `zone_and_analyze` for every community
+
+    Scratch directories go in `scratch_root` (the system's temporary
+    directory by default)
+
+    Returns a table with one row per community: how many zonings were
+    analyzed and passed, how long it took, and the error if it failed.
+    It's also saved to `results_path` as each community finishes
+    """
+    shapefiles = find_shapefiles(shapefile_dir)
+    if communities is not None:
+        missing = set(communities) - set(shapefiles)
+        if missing:
+            raise Exception(f"No shapefiles for {', '.join(sorted(missing))}")
+        shapefiles = {community: shapefiles[community] for community in communities}
+
+    order = sorted(
+        shapefiles, key=lambda c: shapefile_size(shapefiles[c]), reverse=True
+    )
+    os.makedirs("out", exist_ok=True)
+
+    rows = []
+
+    def _save(row):
+        rows.append(row)
+        pd.DataFrame(rows).to_csv(results_path, index=False)
+
+    if workers <= 1:
+        for community in order:
+            _save(
+                _run_community(community, shapefiles[community], scratch_root, kwargs)
+            )
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_community,
+                    community,
+                    shapefiles[community],
+                    scratch_root,
+                    kwargs,
+                )
+                for community in order
+            ]
+            for future in as_completed(futures):
+                _save(future.result())
+
+    table = pd.DataFrame(rows).set_index("community").loc[order].reset_index()
+    table.to_csv(results_path, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("shapefile_dir")
+    parser.add_argument(
+        "--community",
+        action="append",
+        dest="communities",
+        help="only run this community (can be given more than once)",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--zoner", default="r", choices=["r", "python", "search"])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--output", default="zip", choices=["zip", "background", "gpkg", "none"]
+    )
+    parser.add_argument("--results", default="out/communities.csv")
+    parser.add_argument(
+        "--scratch-root",
+        help="where each community's scratch directory goes "
+        "(the system's temporary directory by default)",
+    )
+    args = parser.parse_args()
+
+    table = run_communities(
+        args.shapefile_dir,
+        communities=args.communities,
+        workers=args.workers,
+        scratch_root=args.scratch_root,
+        results_path=args.results,
+        zoner=args.zoner,
+        seed=args.seed,
+        output=None if args.output == "none" else args.output,
+    )
+    print(table.to_string(index=False))
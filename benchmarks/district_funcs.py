@@ -0,0 +1,211 @@
+"""
+Checks that `district_kernel.apply_district_funcs` gives the same
+`District {i}` columns as `compliance_utils.apply_district_funcs`, and
+how much faster it is
+
+Checks:
+    random parcels and parameters (`--trials` of them), made to hit the
+    edges of the formulas: lots at exactly the minimum size, parcels
+    with no area or missing (NaN) areas, limits of 0 (and `""` for the
+    additional lot size), `W` around 2500 and 3000, user-given `O`.
+    Every column has to be exactly the same (NaNs in the same places)
+Times, on the parcels of a made up community (see `synthetic.py`):
+    * `reference`: `compliance_utils.apply_district_funcs`
+    * `numpy`: the fused kernel, in chunks with NumPy
+    * `numba`: the fused kernel, compiled with `numba` (if installed)
+
+Run from the top of the repo (the model reads `./resources`):
+    python benchmarks/district_funcs.py --parcels 20000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.shapefile_processor import column_name_mapper, lean_parcels
+from utils import compliance_utils, district_kernel
+from parameters import PARAMETERS
+import synthetic
+
+
+def _random_parameters(rng):
+    # each parameter either from values that sit on an edge of the
+    # formulas, or anywhere in a range
+    def pick(edges, low, high):
+        return rng.choice(edges) if rng.random() < 0.5 else rng.uniform(low, high)
+
+    return {
+        "min_lot_size": pick([0, 5000, 10000], 0, 20000),
+        "min_required_open_space": pick([0, 0.2, 1, 1.5], 0, 1.2),
+        "water_included": rng.choice(["Y", "N"]),
+        "parking_spaces_per_unit": pick([0, 0.01, 0.5, 1, 1.25, 1.5], 0, 2),
+        "building_height": pick([0, 1, 3, 100], 0, 12),
+        "max_dwelling_units_per_acre": pick([0, 15, 100000], 0, 60),
+        "max_lot_coverage": pick([0, 0.1, 1], 0, 1),
+        "base_min_lot_size": pick([0, 5000], 0, 10000),
+        # `""` is no limit
+        "additional_lot_SF": "" if rng.random() < 0.2 else pick([0, 1000], 1, 5000),
+        "max_units_per_lot": pick([0, 2, 3, 4, 100000], 0, 10),
+        "FAR": pick([0, 0.9, 3], 0, 4),
+        "lot_area_per_dwelling_unit": pick([0, 100, 2000], 0, 5000),
+    }
+
+
+def _random_parcels(rng, n_parcels, min_lot_size, with_o):
+    # square feet, with some parcels of no area and some at exactly the
+    # minimum lot size
+    sqft = rng.lognormal(9, 1.5, n_parcels)
+    sqft[rng.random(n_parcels) < 0.05] = 0
+    sqft[rng.random(n_parcels) < 0.05] = min_lot_size
+    sqft = np.round(sqft, rng.integers(0, 3))
+
+    # excluded land, sometimes none, sometimes all of it (or more)
+    excluded = sqft * rng.choice([0, 0.3, 1, 1.2, rng.random()], n_parcels)
+
+    # and some parcels without one or the other
+    sqft[rng.random(n_parcels) < 0.02] = np.nan
+    excluded[rng.random(n_parcels) < 0.02] = np.nan
+
+    df = pd.DataFrame({"I": sqft, "L": excluded})
+    if with_o:
+        o = rng.uniform(-100, 50000, n_parcels)
+        o[rng.random(n_parcels) < 0.3] = 0
+        o[rng.random(n_parcels) < 0.5] = np.nan
+        df["O"] = o
+    return df
+
+
+def _differences(expected, got):
+    """
+    Returns the columns that `got` doesn't have exactly the same as
+    `expected`
+    """
+    differences = []
+    if list(got.columns) != list(expected.columns):
+        differences.append("column order")
+    for col in compliance_utils.DISTRICT_FUNC_COLUMNS:
+        if col == "O":
+            continue
+        if col == "AD":
+            same = (got[col] == "Y").equals(expected[col] == "Y")
+        else:
+            same = np.array_equal(
+                got[col].to_numpy(dtype=float),
+                expected[col].to_numpy(dtype=float),
+                equal_nan=True,
+            )
+        if not same:
+            differences.append(col)
+    return differences
+
+
+def check(trials, seed, engines):
+    """
+    Compares the fused kernel against `apply_district_funcs` on `trials`
+    random sets of parcels and parameters, and raises if any column of
+    any of `engines` isn't exactly the same
+    """
+    rng = np.random.default_rng(seed)
+    for trial in range(trials):
+        params = _random_parameters(rng)
+        parcels = _random_parcels(
+            rng,
+            int(rng.integers(1, 3 * district_kernel.CHUNK_SIZE)),
+            params["min_lot_size"],
+            with_o=rng.random() < 0.3,
+        )
+
+        expected = parcels.copy()
+        compliance_utils.apply_district_funcs(expected, **params)
+
+        for engine in engines:
+            got = parcels.copy()
+            district_kernel.apply_district_funcs(got, engine=engine, **params)
+            differences = _differences(expected, got)
+            if differences:
+                raise Exception(
+                    f"Trial {trial} ({engine}) differs in {differences}, with {params}"
+                )
+
+
+def _time(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def run(n_parcels, repeats, seed, engines):
+    parcels = synthetic.parcel_grid(n_parcels, seed=seed)
+    parcels_df = lean_parcels(
+        parcels.drop(columns="geometry")
+        .reset_index()
+        .rename(columns=column_name_mapper)
+    )
+    params = compliance_utils.district_parameters(PARAMETERS, 1, "N")
+
+    results = {
+        "parcels": n_parcels,
+        "reference_seconds": _time(
+            lambda: compliance_utils.apply_district_funcs(parcels_df.copy(), **params),
+            repeats,
+        ),
+    }
+    for engine in engines:
+        seconds = _time(
+            lambda: district_kernel.apply_district_funcs(
+                parcels_df.copy(), engine=engine, **params
+            ),
+            repeats,
+        )
+        results[f"{engine}_seconds"] = seconds
+        results[f"{engine}_speedup"] = results["reference_seconds"] / seconds
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--parcels", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also save the results to this file")
+    args = parser.parse_args()
+
+    engines = ["numpy"]
+    if district_kernel._numba() is not None:
+        engines.append("numba")
+        # compile it before anything is timed
+        district_kernel.district_funcs(
+            np.ones(1),
+            np.zeros(1),
+            **compliance_utils.district_parameters(PARAMETERS, 1, "N"),
+        )
+    else:
+        print("numba isn't installed, so only the NumPy kernel is checked\n")
+
+    check(args.trials, args.seed, engines)
+    print(f"{args.trials} random trials gave the same columns ({', '.join(engines)})\n")
+
+    all_results = []
+    for n_parcels in args.parcels:
+        results = run(n_parcels, args.repeats, args.seed, engines)
+        all_results.append(results)
+
+        for name, value in results.items():
+            print(
+                f"{name:>20}: {value:.6g}"
+                if isinstance(value, float)
+                else f"{name:>20}: {value}"
+            )
+        print()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=4)
@@ -0,0 +1,137 @@
+"""
+How fast the sums of the `District {i}` sheets can be taken, for one
+zoning of a made up community (see `synthetic.py`)
+
+Times:
+    * `builtin`: how `populate_sheet` used to do it, with Python's `sum`
+    and `df.query` for each sum
+    * `district_sums`: `compliance_utils.district_sums`, one district
+    at a time (what `populate_sheet` does now)
+    * `segmented_sums`: `batch_model.segmented_sums`, for all the
+    districts at once from the zoning's labels
+and checks that they all give the same sums
+
+Run from the top of the repo (the model reads `./resources`):
+    python benchmarks/district_sums.py --parcels 20000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.shapefile_processor import column_name_mapper, lean_parcels
+from src.batch_model import district_index, parcel_tables, segmented_sums
+from utils import compliance_utils
+from parameters import PARAMETERS
+import synthetic
+
+
+def _builtin_sums(df):
+    # `populate_district_i` before `compliance_utils.district_sums`
+    values = {}
+    values["B10"] = len(df)
+    values["B11"] = sum(df["H"])
+    values["B12"] = sum(df["W"])
+    values["B13"] = sum(df["AF"])
+    values["F9"] = len(df.query("AD == 'Y'"))
+    values["F10"] = sum(df.query("G == 'Y'")["AF"])
+    values["F11"] = sum(df["L"])
+    values["F12"] = sum(df["T"])
+    values["F13"] = sum(df.query("U > 0")["U"])
+    values["X_sum"] = sum(df["X"])
+    values["Y_sum"] = sum(df["Y"])
+    values["Z_sum"] = sum(df["Z"])
+    values["AA_sum"] = sum(df["AA"])
+    values["AB_sum"] = sum(df["AB"])
+    values["AC_sum"] = sum(df["AC"])
+    values["AE_sum"] = sum(df["AE"])
+    values["AF_sum"] = sum(df["AF"])
+    return np.array([values[name] for name in compliance_utils.DISTRICT_SUMS])
+
+
+def _time(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        ret = func()
+    return (time.perf_counter() - start) / repeats, ret
+
+
+def run(n_parcels, n_districts, repeats, seed):
+    parcels = synthetic.parcel_grid(n_parcels, seed=seed)
+    synthetic.station_areas(parcels, 3, seed=seed)
+    parcels_df = lean_parcels(
+        parcels.drop(columns="geometry")
+        .reset_index()
+        .rename(columns=column_name_mapper)
+    )
+    zoning = synthetic.band_zonings(parcels, n_districts, 1, seed=seed)[0]
+
+    cache = compliance_utils.DistrictFuncCache(parcels_df)
+    tables = parcel_tables(cache, PARAMETERS)
+    districts = district_index([zoning])
+
+    sheets = []
+    for i in range(1, n_districts + 1):
+        df = parcels_df[zoning == i].reset_index(drop=True)
+        # like `process_shapefile` makes them, so the cache is used
+        df.attrs["sheet_mode"] = "join"
+        cache.apply_district_funcs(
+            df, **compliance_utils.district_parameters(PARAMETERS, i, "N")
+        )
+        sheets.append(df)
+
+    builtin_seconds, builtin = _time(
+        lambda: [_builtin_sums(df) for df in sheets], repeats
+    )
+    fused_seconds, fused = _time(
+        lambda: [compliance_utils.district_sums(df) for df in sheets], repeats
+    )
+    segmented_seconds, segmented = _time(
+        lambda: segmented_sums(districts, tables)[0], repeats
+    )
+
+    same = np.allclose(builtin, fused) and np.allclose(fused, segmented[:n_districts])
+    if not same:
+        raise Exception("The sums don't match")
+
+    return {
+        "parcels": n_parcels,
+        "districts": n_districts,
+        "builtin_seconds_per_plan": builtin_seconds,
+        "district_sums_seconds_per_plan": fused_seconds,
+        "segmented_sums_seconds_per_plan": segmented_seconds,
+        "district_sums_speedup": builtin_seconds / fused_seconds,
+        "segmented_sums_speedup": builtin_seconds / segmented_seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--parcels", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--districts", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also save the results to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for n_parcels in args.parcels:
+        results = run(n_parcels, args.districts, args.repeats, args.seed)
+        all_results.append(results)
+
+        for name, value in results.items():
+            print(
+                f"{name:>32}: {value:.6g}"
+                if isinstance(value, float)
+                else f"{name:>32}: {value}"
+            )
+        print()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=4)
@@ -0,0 +1,100 @@
+"""
+How fast `src/optimizer.py` can search, next to analyzing each zoning
+from scratch
+
+Times, for one community:
+    * `analyze_zoning` on whole zonings (what every step would cost
+    without `move_parcels`)
+    * `ComplianceModel.move_parcels` moving one parcel
+    * `ZoningSearch.step`, including the contiguity check
+
+Run from the top of the repo (the model reads `./resources`):
+    python benchmarks/optimizer_throughput.py --shapefile community.zip
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interface
+from src.shapefile_processor import CommunitySession
+from src.zoner import cached_parcel_adjacency, PlanGenerator
+from src.optimizer import ZoningSearch
+
+
+def _analyze(community, shapefile, plan, session):
+    return interface.analyze_zoning(community, shapefile, 0, plan, session, output=None)
+
+
+def run(community, shapefile, n_districts, n_plans, n_moves, n_steps, seed):
+    session = CommunitySession(shapefile)
+    adjacency = cached_parcel_adjacency(session.land_map_gdf, session.shapefile_hash)
+    generator = PlanGenerator(adjacency, n_districts)
+    rng = np.random.default_rng(seed)
+    plans = generator.chain(generator.initial_plan(rng), rng, n_plans)
+
+    start = time.perf_counter()
+    for plan in plans:
+        _analyze(community, shapefile, plan, session)
+    full_seconds = (time.perf_counter() - start) / n_plans
+
+    model = _analyze(community, shapefile, plans[-1], session)
+    parcels = rng.choice(np.flatnonzero(plans[-1] == 1), size=n_moves)
+    start = time.perf_counter()
+    for parcel in parcels:
+        model.move_parcels([parcel], 1, 2)
+        model.move_parcels([parcel], 2, 1)
+    move_seconds = (time.perf_counter() - start) / (2 * n_moves)
+
+    search = ZoningSearch(model, adjacency, plans[-1])
+    start = time.perf_counter()
+    accepted = sum(search.step(rng, 0.05) for _ in range(n_steps))
+    step_seconds = (time.perf_counter() - start) / n_steps
+
+    return {
+        "community": community,
+        "parcels": len(session),
+        "districts": n_districts,
+        "analyze_zoning_per_second": 1 / full_seconds,
+        "move_parcels_per_second": 1 / move_seconds,
+        "search_steps_per_second": 1 / step_seconds,
+        "search_acceptance": accepted / n_steps,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--community", default="Cambridge")
+    parser.add_argument("--shapefile", default="./community.zip")
+    parser.add_argument("--districts", type=int, default=3)
+    parser.add_argument("--plans", type=int, default=20)
+    parser.add_argument("--moves", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also save the results to this file")
+    args = parser.parse_args()
+
+    results = run(
+        args.community,
+        args.shapefile,
+        args.districts,
+        args.plans,
+        args.moves,
+        args.steps,
+        args.seed,
+    )
+    for name, value in results.items():
+        print(
+            f"{name:>28}: {value:.6g}"
+            if isinstance(value, float)
+            else f"{name:>28}: {value}"
+        )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
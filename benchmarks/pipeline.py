@@ -0,0 +1,253 @@
+"""
+How long each stage of analyzing a zoning takes, on made up communities
+of different sizes (see `synthetic.py`), so that nothing here needs the
+state's shapefiles
+
+Times, for each community size:
+    * `load`: making the `CommunitySession` (reading and projecting the
+    parcels, and the station areas), once per run
+    * `station_overlay`: `shapefile_utils.parcel_station_area` on its
+    own, also once per run
+    * `district_func_cache`: filling the `DistrictFuncCache` for each
+    district's parameters, also once per run
+    * `dissolve`: merging each zoning's parcels into districts, which
+    only happens when the zoned shapefiles are saved
+    * `district_sheets`: `process_shapefile` without saving anything
+    * `apply_district_funcs`: the district formulas on each zoning's
+    `District {i}` sheets, without the `DistrictFuncCache`
+    * `populate`: `interface.fill_model`, which takes the formulas from
+    the cache
+    * `score`: `is_good_zoning`
+    * `analyze_zoning`: everything above for one zoning, like
+    `zone_and_analyze` does it with `output=None`
+    * `batch_model`: `evaluate_zonings` on all the zonings at once
+and reports each one per zoning and per 100 zonings
+
+Run from the top of the repo (the model reads `./resources`):
+    python benchmarks/pipeline.py --parcels 1000 10000 100000 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import tempfile
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interface
+from src.shapefile_processor import CommunitySession, process_shapefile
+from src.batch_model import evaluate_zonings
+from utils import calc_layers, compliance_utils, shapefile_utils
+from parameters import PARAMETERS
+import synthetic
+
+PER_RUN_STAGES = ["load", "station_overlay", "district_func_cache"]
+PER_ZONING_STAGES = [
+    "dissolve",
+    "district_sheets",
+    "apply_district_funcs",
+    "populate",
+    "score",
+    "analyze_zoning",
+    "batch_model",
+]
+
+
+@contextlib.contextmanager
+def _quiet():
+    # pandas warns about `compliance_utils.apply_district_funcs` every time
+    # it runs, which would drown out the timings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        yield
+
+
+@contextlib.contextmanager
+def _station_layer(half_mile_path, cache_dir):
+    """
+    Points `calc_layers` at the made up station areas while running
+    """
+    saved = calc_layers.HALF_MILE_PATH, calc_layers.CACHE_DIR
+    calc_layers.HALF_MILE_PATH, calc_layers.CACHE_DIR = half_mile_path, cache_dir
+    calc_layers._loaded.clear()
+    try:
+        yield
+    finally:
+        calc_layers.HALF_MILE_PATH, calc_layers.CACHE_DIR = saved
+        calc_layers._loaded.clear()
+
+
+def _timed(seconds, stage, func, *args, **kwargs):
+    """
+    Calls `func`, adds how long it took to `seconds[stage]`, and returns
+    what it returned
+    """
+    start = time.perf_counter()
+    ret = func(*args, **kwargs)
+    seconds[stage] = seconds.get(stage, 0) + time.perf_counter() - start
+    return ret
+
+
+def _fill_cache(cache):
+    for i in range(1, 6):
+        cache.table(**compliance_utils.district_parameters(PARAMETERS, i, "N"))
+
+
+def _dissolve(land_map_gdf, zoning):
+    gdf = land_map_gdf[["geometry"]].copy()
+    gdf["zone_id"] = zoning
+    return shapefile_utils.area_projection(gdf.dissolve(by="zone_id"))
+
+
+def _apply_district_funcs(sheets):
+    for i in range(1, 6):
+        compliance_utils.apply_district_funcs(
+            sheets[f"District {i}"].copy(),
+            **compliance_utils.district_parameters(PARAMETERS, i, "N"),
+        )
+
+
+def _fill_model(community, checklist_district_stuff, sheets, session):
+    # the same as `interface.analyze_zoning` after `process_shapefile`
+    all_data = interface.INITIALIZATIONS.copy()
+    all_data[interface.INTRODUCTION]["I3"] = community
+    all_data.update(checklist_district_stuff)
+    all_data[interface.CHECKLIST_DISTRICT_ID]["C43"] = "N"
+    all_data.update(sheets)
+    return interface.fill_model(all_data, session)
+
+
+def run(community, n_parcels, n_districts, n_plans, n_stations, seed):
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as temp_dir:
+        shapefile, half_mile_path, parcels = synthetic.make_community(
+            temp_dir, n_parcels, n_stations=n_stations, seed=seed
+        )
+        zonings = synthetic.band_zonings(parcels, n_districts, n_plans, seed=seed)
+
+        seconds = {}
+        with _station_layer(half_mile_path, os.path.join(temp_dir, "cache")), _quiet():
+            session = _timed(seconds, "load", CommunitySession, shapefile)
+            _timed(
+                seconds,
+                "station_overlay",
+                shapefile_utils.parcel_station_area,
+                session.land_map_gdf,
+                calc_layers.half_mile_gdf(),
+            )
+            _timed(
+                seconds,
+                "district_func_cache",
+                _fill_cache,
+                session.district_func_cache,
+            )
+
+            passed = 0
+            for idx, zoning in enumerate(zonings):
+                _timed(seconds, "dissolve", _dissolve, session.land_map_gdf, zoning)
+                checklist_district_stuff, sheets = _timed(
+                    seconds,
+                    "district_sheets",
+                    process_shapefile,
+                    shapefile,
+                    zoning,
+                    None,
+                    session=session,
+                    output=None,
+                )
+                _timed(seconds, "apply_district_funcs", _apply_district_funcs, sheets)
+                model = _timed(
+                    seconds,
+                    "populate",
+                    _fill_model,
+                    community,
+                    checklist_district_stuff,
+                    sheets,
+                    session,
+                )
+                passed += _timed(seconds, "score", model.is_good_zoning)
+                _timed(
+                    seconds,
+                    "analyze_zoning",
+                    interface.analyze_zoning,
+                    community,
+                    shapefile,
+                    idx,
+                    zoning,
+                    session,
+                    output=None,
+                )
+
+            _timed(
+                seconds,
+                "batch_model",
+                evaluate_zonings,
+                np.array(zonings),
+                session.parcels_df,
+                community,
+                PARAMETERS,
+                session.parcel_area.to_numpy(),
+                session.parcel_stn_area.to_numpy(),
+                cache=session.district_func_cache,
+            )
+
+    results = {
+        "community": community,
+        "parcels": n_parcels,
+        "districts": n_districts,
+        "plans": n_plans,
+        "stations": n_stations,
+        "passed": passed,
+    }
+    for stage in PER_RUN_STAGES:
+        results[f"{stage}_seconds"] = seconds[stage]
+    for stage in PER_ZONING_STAGES:
+        results[f"{stage}_seconds_per_plan"] = seconds[stage] / n_plans
+        results[f"{stage}_seconds_per_100_plans"] = 100 * seconds[stage] / n_plans
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--community", default="Cambridge")
+    parser.add_argument(
+        "--parcels",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="sizes of the made up communities (1000 to 200000 parcels)",
+    )
+    parser.add_argument("--districts", type=int, default=3)
+    parser.add_argument("--plans", type=int, default=10)
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also save the results to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for n_parcels in args.parcels:
+        results = run(
+            args.community,
+            n_parcels,
+            args.districts,
+            args.plans,
+            args.stations,
+            args.seed,
+        )
+        all_results.append(results)
+
+        for name, value in results.items():
+            print(
+                f"{name:>44}: {value:.6g}"
+                if isinstance(value, float)
+                else f"{name:>44}: {value}"
+            )
+        print()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=4)
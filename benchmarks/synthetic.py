@@ -0,0 +1,159 @@
+"""
+Makes up communities for the benchmarks, so they can run without the
+state's shapefiles
+
+The parcels are a grid of rectangles (with columns and rows of random
+widths), with the columns of a basic shapefile that `process_shapefile`
+uses. The station areas are half-mile circles around random points in
+the grid, saved like `resources/half_mile.zip`
+"""
+
+import os
+import zipfile
+import tempfile
+import numpy as np
+import shapely
+import geopandas as gpd
+
+# somewhere in Massachusetts, in the NAD83 MA projection (meters)
+ORIGIN = (230000.0, 900000.0)
+HALF_MILE = 804.672
+SQ_FEET_PER_SQ_METER = 10.7639104
+SQ_FEET_PER_ACRE = 43560
+
+
+def grid_shape(n_parcels):
+    """
+    Returns `(n_rows, n_cols)` of the smallest near-square grid with at
+    least `n_parcels` cells
+    """
+    n_cols = int(np.ceil(np.sqrt(n_parcels)))
+    n_rows = int(np.ceil(n_parcels / n_cols))
+    return n_rows, n_cols
+
+
+def parcel_grid(n_parcels, seed=None, min_width=15.0, max_width=60.0):
+    """
+    Returns a GeoDataFrame (in the NAD83 MA projection) of `n_parcels`
+    rectangular parcels in rows, filled row by row. Columns and rows are
+    between `min_width` and `max_width` meters wide
+
+    Has the `LOC_ID`, `ACRES`, `SQFT`, `Tot_Exclud` and `TRANSIT`
+    columns of a basic shapefile, along with `row` and `col`, the
+    parcel's place in the grid. `TRANSIT` is filled in by
+    `station_areas`
+    """
+    rng = np.random.default_rng(seed)
+    n_rows, n_cols = grid_shape(n_parcels)
+
+    xs = ORIGIN[0] + np.concatenate(
+        [[0], np.cumsum(rng.uniform(min_width, max_width, n_cols))]
+    )
+    ys = ORIGIN[1] + np.concatenate(
+        [[0], np.cumsum(rng.uniform(min_width, max_width, n_rows))]
+    )
+
+    row, col = np.divmod(np.arange(n_parcels), n_cols)
+    geometry = shapely.box(xs[col], ys[row], xs[col + 1], ys[row + 1])
+    sqft = shapely.area(geometry) * SQ_FEET_PER_SQ_METER
+
+    # about a fifth of the parcels have some of their area excluded
+    excluded = np.where(
+        rng.random(n_parcels) < 0.2, sqft * rng.uniform(0, 1, n_parcels), 0
+    )
+
+    return gpd.GeoDataFrame(
+        {
+            "LOC_ID": [f"M_{r}_{c}" for r, c in zip(row, col)],
+            "ACRES": sqft / SQ_FEET_PER_ACRE,
+            "SQFT": sqft,
+            "Tot_Exclud": excluded,
+            "TRANSIT": "N",
+            "row": row,
+            "col": col,
+        },
+        geometry=geometry,
+        crs="EPSG:26986",
+    )
+
+
+def station_areas(parcels_gdf, n_stations, seed=None):
+    """
+    Returns a GeoDataFrame of half-mile circles around `n_stations`
+    random points inside the bounds of `parcels_gdf`, and sets the
+    `TRANSIT` column of the parcels whose centers are in one of them
+    """
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = parcels_gdf.total_bounds
+
+    centers = shapely.points(
+        rng.uniform(xmin, xmax, n_stations), rng.uniform(ymin, ymax, n_stations)
+    )
+    stations = gpd.GeoDataFrame(
+        {"STATION": [f"Station {k}" for k in range(n_stations)]},
+        geometry=shapely.buffer(centers, HALF_MILE),
+        crs=parcels_gdf.crs,
+    )
+
+    if n_stations:
+        inside = shapely.STRtree(stations.geometry.values).query(
+            parcels_gdf.geometry.centroid.values, predicate="within"
+        )[0]
+        parcels_gdf["TRANSIT"] = np.where(
+            np.isin(np.arange(len(parcels_gdf)), inside), "Y", "N"
+        )
+
+    return stations
+
+
+def save_zipped(gdf, path):
+    """
+    Saves `gdf` as a shapefile zipped into `path`, like the state's
+    shapefiles are given
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    with tempfile.TemporaryDirectory(prefix="synthetic_") as temp_dir:
+        gdf.to_file(os.path.join(temp_dir, f"{name}.shp"))
+        with zipfile.ZipFile(path, "w") as zipf:
+            for file in sorted(os.listdir(temp_dir)):
+                zipf.write(os.path.join(temp_dir, file), arcname=file)
+
+
+def make_community(directory, n_parcels, n_stations=3, seed=None):
+    """
+    Saves a made up community with `n_parcels` parcels to
+    `{directory}/community.zip` and its station areas to
+    `{directory}/half_mile.zip`
+
+    Returns `(community_path, half_mile_path, parcels_gdf)`
+    """
+    rng = np.random.default_rng(seed)
+    parcels = parcel_grid(n_parcels, seed=rng)
+    stations = station_areas(parcels, n_stations, seed=rng)
+
+    community_path = os.path.join(directory, "community.zip")
+    half_mile_path = os.path.join(directory, "half_mile.zip")
+    save_zipped(parcels.drop(columns=["row", "col"]), community_path)
+    save_zipped(stations, half_mile_path)
+
+    return community_path, half_mile_path, parcels
+
+
+def band_zonings(parcels_gdf, n_districts, n_plans, seed=None):
+    """
+    Returns `n_plans` zonings of `parcels_gdf` (a `parcel_grid`) into
+    `n_districts` contiguous bands of columns, cut at random places.
+    Each is an array with the district (1 to `n_districts`) of each parcel
+    """
+    rng = np.random.default_rng(seed)
+    col = parcels_gdf["col"].to_numpy()
+    n_cols = col.max() + 1
+    if n_cols < n_districts:
+        raise Exception(f"The grid is too narrow for {n_districts} districts")
+
+    zonings = []
+    for _ in range(n_plans):
+        cuts = np.sort(rng.choice(np.arange(1, n_cols), n_districts - 1, replace=False))
+        zonings.append(np.searchsorted(cuts, col, side="right") + 1)
+
+    return zonings
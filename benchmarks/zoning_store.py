@@ -0,0 +1,106 @@
+"""
+How long saving and loading zonings takes as JSON (like the older
+`cached.json`) and in a `ZoningStore`, with random zonings
+
+Times:
+    * `save`: writing all the zonings (one at a time for the store,
+    like while they're made)
+    * `load`: getting all of them back
+    * `one_plan`: loading, then getting one zoning out
+
+Run from the top of the repo:
+    python benchmarks/zoning_store.py --plans 10000 --parcels 20000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.zoning_store import ZoningStore
+
+
+def _timed(func):
+    start = time.perf_counter()
+    ret = func()
+    return time.perf_counter() - start, ret
+
+
+def run(n_plans, n_parcels, seed):
+    rng = np.random.default_rng(seed)
+    zonings = rng.integers(1, 4, (n_plans, n_parcels), dtype=np.uint8)
+
+    results = {"plans": n_plans, "parcels": n_parcels}
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "cached.json")
+        store_path = os.path.join(directory, "zonings.npy")
+
+        def _save_json():
+            with open(json_path, "w") as f:
+                json.dump(zonings.tolist(), f)
+
+        def _load_json():
+            with open(json_path, "r") as f:
+                return json.load(f)
+
+        def _save_store():
+            store = ZoningStore.create(store_path, n_parcels, n_districts=3)
+            for zoning in zonings:
+                store.append(zoning)
+
+        results["json_save_seconds"], _ = _timed(_save_json)
+        results["json_load_seconds"], loaded = _timed(_load_json)
+        results["json_one_plan_seconds"], _ = _timed(lambda: _load_json()[-1])
+        results["json_mb"] = os.path.getsize(json_path) / 2**20
+        same_json = np.array_equal(loaded, zonings)
+        del loaded
+
+        results["store_save_seconds"], _ = _timed(_save_store)
+        results["store_load_seconds"], loaded = _timed(
+            lambda: np.asarray(ZoningStore(store_path))
+        )
+        results["store_one_plan_seconds"], _ = _timed(
+            lambda: ZoningStore(store_path)[-1]
+        )
+        results["store_mb"] = os.path.getsize(store_path) / 2**20
+        same_store = np.array_equal(loaded, zonings)
+        del loaded
+
+    if not (same_json and same_store):
+        raise Exception("The zonings that were loaded aren't the ones saved")
+
+    results["load_speedup"] = (
+        results["json_load_seconds"] / results["store_load_seconds"]
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--plans", type=int, default=1000)
+    parser.add_argument("--parcels", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also save the results to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for n_parcels in args.parcels:
+        results = run(args.plans, n_parcels, args.seed)
+        all_results.append(results)
+
+        for name, value in results.items():
+            print(
+                f"{name:>24}: {value:.6g}"
+                if isinstance(value, float)
+                else f"{name:>24}: {value}"
+            )
+        print()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=4)
@@ -9,9 +9,17 @@ this file is supposed to do the final wiring from start to finish:
 import os
 import json
 import zipfile
-import pyper
-from src.shapefile_processor import process_shapefile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.shapefile_processor import CommunitySession, process_shapefile
 from src.excel_model import ComplianceModel
+from src.zoner import cached_parcel_adjacency, generate_plans, PlanGenerator
+from src.optimizer import search_plans
+from utils import compliance_utils, result_utils, output_utils, profile_utils
+from utils import zoning_store
+from utils.result_store import ResultStore
 from parameters import PARAMETERS
 
 INTRODUCTION = "Introduction"
@@ -24,128 +32,488 @@ DISTRICT_4 = "District 4"
 DISTRICT_5 = "District 5"
 SUMMARY = "Summary"
 
-INITIALIZATIONS = {
-    INTRODUCTION: {},
-    CHECKLIST_PARAMETERS: PARAMETERS
-}
+INITIALIZATIONS = {INTRODUCTION: {}, CHECKLIST_PARAMETERS: PARAMETERS}
 
+# what the worker processes need from `zone_and_analyze`. Set right before
+# the workers are forked, so they get it (and the parcels in it) without
+# it ever being pickled
+_WORKER_STATE = {}
 
-def zone_and_analyze(city_name, path_to_shp, use_cache=False, run_once=False):
-    """
-    Does what's described above. Returns a list `results`, where
-    `results[i]` is True iff `zoning[i]` from the generated zonings
-    is accepted by the compliance model
 
-    Use `use_cache` to run on an older set of zonings. Helpful for debugging.
-    Will fail if cache does not exist from a previous run
+def fill_model(data_in, session=None):
+    all_data = data_in.copy()
 
-    Use `run_once` to only run for one zoning, save the output, and stop
-    """
+    if session is None:
+        model = ComplianceModel()
+    else:
+        model = ComplianceModel(
+            district_func_cache=session.district_func_cache,
+            parcel_area=session.parcel_area.to_numpy(),
+            parcel_stn_area=session.parcel_stn_area.to_numpy(),
+        )
 
-    def extract_and_rename_shapefiles(zip_path, extract_dir):
-        """
-        Extract .shp, .shx, and .dbf files from the zip archive and rename them to
-        community.shp, community.shx, community.dbf
-        """
-        os.makedirs(extract_dir, exist_ok=True)
+    model.fill_sheet(INTRODUCTION, all_data[INTRODUCTION])
+    model.populate_sheet(INTRODUCTION)
 
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            # Filter files with extensions .shp, .shx, .dbf
-            files_to_extract = [
-                f for f in zip_ref.namelist() if f.endswith((".shp", ".shx", ".dbf"))
-            ]
+    model.fill_sheet(CHECKLIST_DISTRICT_ID, all_data[CHECKLIST_DISTRICT_ID])
+    model.populate_sheet(CHECKLIST_DISTRICT_ID)
 
-            for file in files_to_extract:
-                # Extract the file
-                zip_ref.extract(file, extract_dir)
+    model.fill_sheet(CHECKLIST_PARAMETERS, all_data[CHECKLIST_PARAMETERS])
+    model.populate_sheet(CHECKLIST_PARAMETERS)
 
-                # Get the file extension
-                _, ext = os.path.splitext(file)
-                new_filename = f"community{ext}"
+    model.fill_sheet(DISTRICT_1, all_data[DISTRICT_1])
+    model.populate_sheet(DISTRICT_1, df=all_data[DISTRICT_1])
+    model.fill_sheet(DISTRICT_2, all_data[DISTRICT_2])
+    model.populate_sheet(DISTRICT_2, df=all_data[DISTRICT_2])
+    model.fill_sheet(DISTRICT_3, all_data[DISTRICT_3])
+    model.populate_sheet(DISTRICT_3, df=all_data[DISTRICT_3])
+    model.fill_sheet(DISTRICT_4, all_data[DISTRICT_4])
+    model.populate_sheet(DISTRICT_4, df=all_data[DISTRICT_4])
+    model.fill_sheet(DISTRICT_5, all_data[DISTRICT_5])
+    model.populate_sheet(DISTRICT_5, df=all_data[DISTRICT_5])
 
-                # Construct file paths
-                old_path = os.path.join(extract_dir, file)
-                new_path = os.path.join(extract_dir, new_filename)
+    model.populate_sheet(SUMMARY)
 
-                # Rename/move the file to the extract directory root
-                os.rename(old_path, new_path)
-                print(f"Extracted and renamed: {file} -> {new_filename}")
+    return model
 
-    def fill_model(data_in):
-        all_data = data_in.copy()
 
-        model = ComplianceModel()
+def analyze_zoning(city_name, path_to_shp, idx, zoning, session, output="zip"):
+    """
+    Runs `zoning` (the `idx`th one) of `city_name` through
+    `process_shapefile` and the compliance model, and returns the
+    filled out model
+
+    `output` is passed on to `process_shapefile`
+    """
+    with profile_utils.stage("analyze_zoning", plan=idx):
+        all_data = INITIALIZATIONS.copy()
+        all_data[INTRODUCTION]["I3"] = city_name
+
+        with profile_utils.stage("process_shapefile"):
+            checklist_district_stuff, sheets = process_shapefile(
+                path_to_shp,
+                zoning,
+                f"out/{city_name}_{idx}",
+                session=session,
+                output=output,
+            )
+
+        all_data.update(checklist_district_stuff)
+        all_data[CHECKLIST_DISTRICT_ID][
+            "C43"
+        ] = "N"  # TODO: make it so that the update doesn't overwrite C43 from initializer
+        all_data.update(sheets)
 
-        model.fill_sheet(INTRODUCTION, all_data[INTRODUCTION])
-        model.populate_sheet(INTRODUCTION)
+        with profile_utils.stage("fill_model"):
+            return fill_model(all_data, session)
 
-        model.fill_sheet(CHECKLIST_DISTRICT_ID, all_data[CHECKLIST_DISTRICT_ID])
-        model.populate_sheet(CHECKLIST_DISTRICT_ID)
 
-        model.fill_sheet(CHECKLIST_PARAMETERS, all_data[CHECKLIST_PARAMETERS])
-        model.populate_sheet(CHECKLIST_PARAMETERS)
+def _analyze_in_worker(idx, zoning):
+    """
+    `analyze_zoning` for a worker process, using what `iter_analyze`
+    left in `_WORKER_STATE`. Only sends back the `Summary` sheet,
+    whether the zoning is good, the zoned shapefiles for the main
+    process to save (unless the worker saves them itself), and what the
+    worker's copy of the profiler recorded (if one is on)
+    """
+    output = _WORKER_STATE["output"]
+    if output == "collect":
+        output = output_utils.CollectingWriter()
+
+    profiler = profile_utils.active()
+    n_records = len(profiler.records) if profiler is not None else 0
+
+    model = analyze_zoning(
+        _WORKER_STATE["city_name"],
+        _WORKER_STATE["path_to_shp"],
+        idx,
+        zoning,
+        _WORKER_STATE["session"],
+        output=output,
+    )
+    written = (
+        output.written if isinstance(output, output_utils.CollectingWriter) else []
+    )
+
+    records = []
+    if profiler is not None:
+        records = profiler.records[n_records:]
+        del profiler.records[n_records:]
+    return (model[SUMMARY], model.is_good_zoning()), written, records
+
+
+def iter_analyze(
+    city_name,
+    path_to_shp,
+    zonings,
+    workers=1,
+    sink_path=None,
+    stop_after=None,
+    session=None,
+    store=None,
+    output="zip",
+):
+    """
+    Generator version of the analysis part of `zone_and_analyze`.
+    Yields `(idx, zoning, summary, passed)` for each of `zonings` as soon
+    as it's done (in order), where `summary` is the model's `Summary`
+    sheet and `passed` is whether the zoning is good
 
-        model.fill_sheet(DISTRICT_1, all_data[DISTRICT_1])
-        model.populate_sheet(DISTRICT_1, df=all_data[DISTRICT_1])
-        model.fill_sheet(DISTRICT_2, all_data[DISTRICT_2])
-        model.populate_sheet(DISTRICT_2, df=all_data[DISTRICT_2])
-        model.fill_sheet(DISTRICT_3, all_data[DISTRICT_3])
-        model.populate_sheet(DISTRICT_3, df=all_data[DISTRICT_3])
-        model.fill_sheet(DISTRICT_4, all_data[DISTRICT_4])
-        model.populate_sheet(DISTRICT_4, df=all_data[DISTRICT_4])
-        model.fill_sheet(DISTRICT_5, all_data[DISTRICT_5])
-        model.populate_sheet(DISTRICT_5, df=all_data[DISTRICT_5])
+    `zonings` can be any iterable, so they don't all have to be in memory
 
-        model.populate_sheet(SUMMARY)
+    Use `workers` like in `zone_and_analyze`. Only a few zonings per
+    worker are taken from `zonings` ahead of time
 
-        return model
+    Use `sink_path` to also append each result to that JSON lines file as
+    soon as it's done, so nothing is lost if the run stops partway
 
-    # use existing zoning if requested, otherwise load a new one
-    if use_cache:
-        with open("cached.json", "r") as f:
-            zonings = json.load(f)
-    else:
-        # this is needed for R... can't figure out how to
-        # open the shp file from just `"./"`
-        abs_path_to_dir = os.path.abspath("./")
-        extract_and_rename_shapefiles(path_to_shp, ".")
+    Use `stop_after` to stop once that many good zonings are found.
+    Otherwise just stop iterating when you've seen enough
 
-        r = pyper.R(use_pandas=True)
-        r("source('./src/zoner.r')")
-        r(f"zonings <- zone('{abs_path_to_dir}', 3)")
-        zonings = r.get("zonings")
+    Use `session` to reuse a `CommunitySession` for `path_to_shp`
 
-    results = [False] * len(zonings)  # initialize result array
+    Use `store` (a `ResultStore`) to skip zonings that were already
+    analyzed with the same shapefile, parameters and community info,
+    and to save the ones that weren't. Running again over the same
+    zonings then picks up where the last run stopped
 
-    for idx, zoning in enumerate(zonings):
-        all_data = INITIALIZATIONS.copy()
-        all_data[INTRODUCTION]["I3"] = city_name
+    Use `output` to pick how each zoned shapefile is saved
+    (see `output_utils.make_writer`). `"gpkg"` saves all of them into
+    `out/{city_name}_zonings.gpkg`
+    """
+
+    def _saved_result(zoning):
+        """
+        Returns `(key, saved)`, where `saved` is the `(summary, passed)`
+        in `store` for `zoning`, or None if it has to be analyzed
+        """
+        if store is None:
+            return None, None
+        key = ResultStore.zoning_key(run_key, zoning)
+        return key, store.get(key)
 
-        (checklist_district_stuff, sheets) = process_shapefile(
-            path_to_shp, zoning, f"out/{city_name}_{idx}"
+    def _analyzed_serially():
+        """
+        Yields `(idx, zoning, key, (summary, passed), is_new)`
+        """
+        for idx, zoning in enumerate(zonings):
+            key, saved = _saved_result(zoning)
+            if saved is not None:
+                yield idx, zoning, key, saved, False
+                continue
+
+            model = analyze_zoning(
+                city_name, path_to_shp, idx, zoning, session, output=writer
+            )
+            yield idx, zoning, key, (model[SUMMARY], model.is_good_zoning()), True
+
+    def _analyzed_in_pool():
+        """
+        Same as `_analyzed_serially`, but analyzing in `workers` processes
+        """
+        # fill the cache before forking so that the workers share it too
+        for i in range(1, 6):
+            session.district_func_cache.table(
+                **compliance_utils.district_parameters(
+                    INITIALIZATIONS[CHECKLIST_PARAMETERS], i, "N"
+                )
+            )
+
+        # zip files can be saved by the workers themselves, but anything
+        # else is sent back here to go to `writer`
+        _WORKER_STATE.update(
+            city_name=city_name,
+            path_to_shp=path_to_shp,
+            session=session,
+            output=output if output in ["zip", None] else "collect",
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
         )
 
-        all_data.update(checklist_district_stuff)
-        all_data[CHECKLIST_DISTRICT_ID][
-            "C43"
-        ] = "N"  # TODO: make it so that the update doesn't overwrite C43 from initializer
-        all_data.update(sheets)
+        def _finished(idx, zoning, key, saved, future):
+            if saved is not None:
+                return idx, zoning, key, saved, False
+
+            result, written, records = future.result()
+            for name, gdf in written:
+                writer.write(name, gdf)
+            profile_utils.add_records(records)
+            return idx, zoning, key, result, True
+
+        try:
+            pending = deque()
+            for idx, zoning in enumerate(zonings):
+                key, saved = _saved_result(zoning)
+                future = None
+                if saved is None:
+                    future = executor.submit(_analyze_in_worker, idx, zoning)
+                pending.append((idx, zoning, key, saved, future))
+
+                if len(pending) >= 2 * workers:
+                    yield _finished(*pending.popleft())
+
+            while pending:
+                yield _finished(*pending.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+            _WORKER_STATE.clear()
+
+    if session is None:
+        with profile_utils.stage("load_session"):
+            session = CommunitySession(path_to_shp)
+    if store is not None:
+        run_key = ResultStore.run_key(
+            session.shapefile_hash,
+            INITIALIZATIONS[CHECKLIST_PARAMETERS],
+            compliance_utils.get_community_info(city_name),
+            "N",
+        )
 
-        model = fill_model(all_data)
-        print(model.is_good_zoning())
-        results[idx] = model.is_good_zoning()
+    writer = output_utils.make_writer(output, f"out/{city_name}_zonings.gpkg")
+
+    n_passed = 0
+    analyzed = _analyzed_in_pool() if workers > 1 else _analyzed_serially()
+    try:
+        for idx, zoning, key, (summary, passed), is_new in analyzed:
+            if is_new and store is not None:
+                store.put(key, summary, passed)
+
+            if sink_path is not None:
+                result_utils.append_jsonl(
+                    sink_path,
+                    {
+                        "idx": idx,
+                        "zoning": list(zoning),
+                        "summary": summary,
+                        "passed": passed,
+                    },
+                )
+
+            yield idx, zoning, summary, passed
+
+            n_passed += passed
+            if stop_after is not None and n_passed >= stop_after:
+                return
+    finally:
+        analyzed.close()
+        if writer is not None:
+            writer.close()
+
+
+def extract_and_rename_shapefiles(zip_path, extract_dir):
+    """
+    Extract .shp, .shx, and .dbf files from the zip archive and rename them to
+    community.shp, community.shx, community.dbf
+    """
+    os.makedirs(extract_dir, exist_ok=True)
+
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        # Filter files with extensions .shp, .shx, .dbf
+        files_to_extract = [
+            f for f in zip_ref.namelist() if f.endswith((".shp", ".shx", ".dbf"))
+        ]
+
+        for file in files_to_extract:
+            # Extract the file
+            zip_ref.extract(file, extract_dir)
+
+            # Get the file extension
+            _, ext = os.path.splitext(file)
+            new_filename = f"community{ext}"
+
+            # Construct file paths
+            old_path = os.path.join(extract_dir, file)
+            new_path = os.path.join(extract_dir, new_filename)
+
+            # Rename/move the file to the extract directory root
+            os.rename(old_path, new_path)
+            print(f"Extracted and renamed: {file} -> {new_filename}")
+
+
+def zone_and_analyze(
+    city_name,
+    path_to_shp,
+    use_cache=False,
+    run_once=False,
+    workers=1,
+    sink_path=None,
+    store_path=None,
+    output="zip",
+    zoner="r",
+    seed=None,
+    work_dir=".",
+    profile_path=None,
+    use_parcel_cache=False,
+):
+    """
+    Does what's described above. Returns the zonings that were analyzed
+    and a list `results`, where `results[i]` is True iff `zoning[i]`
+    is accepted by the compliance model
+
+    Use `zoner` to pick what makes the zonings: `"r"` runs `zoner.r`
+    (the default), `"python"` uses `src/zoner.py` with `seed` in this
+    process, so zonings get analyzed as they are made. `"search"` uses
+    `src/optimizer.py` to look for zonings that pass, starting from a
+    random one
 
-        if run_once:
-            model.save_zoning_stats(f"out/{city_name}_result_{idx}.txt")
-            model.save_all_data("out/all_data.json")
-            break
+    Use `use_cache` to run on an older set of zonings. Helpful for debugging.
+    Will fail if cache does not exist from a previous run, or if it was
+    made for another shapefile
+
+    Use `work_dir` for where the shapefile is extracted for R, and where
+    the zonings are saved as they're made (`zonings.npy`, a
+    `ZoningStore`, which `use_cache` reads). Give each community its own
+    to run several at once
 
-    # clean up
-    os.remove("community.shp")
-    os.remove("community.shx")
-    os.remove("community.dbf")
+    Use `run_once` to only run for one zoning, save the output, and stop
+
+    Use `workers` to analyze the zonings in that many processes at once.
+    The workers are forked, so they share the parcels and the station
+    areas with this process instead of each getting a copy. Results
+    still come back in the same order as the zonings. Only works where
+    processes can be forked (so not on Windows)
+
+    Use `sink_path` to save each result as soon as it's done
+    (see `iter_analyze`)
+
+    Use `store_path` to keep results in a `ResultStore` at that path, so
+    that running again (like after a crash) skips the zonings that were
+    already analyzed with the same inputs
+
+    Use `output` to pick how the zoned shapefiles are saved: `"zip"`
+    (one zip per zoning, the default), `"background"` (the same, but on
+    a separate thread), `"gpkg"` (all of them in one GeoPackage) or None
+    (not saved)
+
+    Use `use_parcel_cache` to read the parcels from their columnar cache
+    (see `utils.parcel_cache`, needs `pyarrow`), which is made the first
+    time. Later runs on the same shapefile then skip reading it
+
+    Use `profile_path` to save how long each stage took (and how much
+    memory it used) to that file, as a Chrome trace if it ends with
+    `.trace.json` and as JSON records otherwise (see `profile_utils`).
+    With `workers`, the stages of each zoning come from the worker that
+    analyzed it
+    """
+    if profile_path is not None:
+        with profile_utils.profiling() as profiler:
+            try:
+                return zone_and_analyze(
+                    city_name,
+                    path_to_shp,
+                    use_cache=use_cache,
+                    run_once=run_once,
+                    workers=workers,
+                    sink_path=sink_path,
+                    store_path=store_path,
+                    output=output,
+                    zoner=zoner,
+                    seed=seed,
+                    work_dir=work_dir,
+                    use_parcel_cache=use_parcel_cache,
+                )
+            finally:
+                profiler.save(profile_path)
+
+    # the parcels are the same for every zoning, so only read them once
+    with profile_utils.stage("load_session"):
+        session = CommunitySession(path_to_shp, use_parcel_cache=use_parcel_cache)
+
+    # use existing zoning if requested, otherwise load a new one
+    store_file = os.path.join(work_dir, zoning_store.ZONINGS_FILE)
+    if use_cache:
+        zonings = zoning_store.ZoningStore(store_file)
+        if zonings.metadata["shapefile_hash"] != session.shapefile_hash:
+            raise Exception(f"The zonings in {store_file} are of another shapefile")
+        if zonings.n_parcels != len(session.parcels_df):
+            raise Exception(
+                f"The zonings in {store_file} have {zonings.n_parcels} parcels, "
+                f"but {path_to_shp} has {len(session.parcels_df)}"
+            )
+    elif zoner == "python":
+        adjacency = cached_parcel_adjacency(
+            session.land_map_gdf, session.shapefile_hash
+        )
+        zonings = generate_plans(adjacency, 3, 100, seed=seed)
+    elif zoner == "search":
+        adjacency = cached_parcel_adjacency(
+            session.land_map_gdf, session.shapefile_hash
+        )
+        start = PlanGenerator(adjacency, 3).initial_plan(np.random.default_rng(seed))
+        start_model = analyze_zoning(
+            city_name, path_to_shp, 0, start, session, output=None
+        )
+        zonings = search_plans(start_model, adjacency, start, 100, seed=seed)
+    else:
+        # this is needed for R... can't figure out how to
+        # open the shp file from just `"./"`
+        abs_path_to_dir = os.path.abspath(work_dir)
+        extract_and_rename_shapefiles(path_to_shp, work_dir)
+
+        # only needed for R, so the other zoners work without it
+        import pyper
+
+        with profile_utils.stage("zoner_r"):
+            r = pyper.R(use_pandas=True)
+            r("source('./src/zoner.r')")
+            r(f"zonings <- zone('{abs_path_to_dir}', 3)")
+            zonings = r.get("zonings")
+
+        # clean up
+        for ext in [".shp", ".shx", ".dbf"]:
+            os.remove(os.path.join(work_dir, f"community{ext}"))
+
+    if not use_cache:
+        # saved for `use_cache`: R's all at once, since they're all made
+        # already, and the others as they're made
+        saved_zonings = zoning_store.ZoningStore.create(
+            store_file,
+            len(session.parcels_df),
+            shapefile_hash=session.shapefile_hash,
+            n_districts=3,
+            seed=seed,
+        )
+        if zoner in ["python", "search"]:
+            zonings = saved_zonings.appending(zonings)
+        else:
+            saved_zonings.extend(zonings)
+
+    analyzed_zonings, results = [], []
+
+    if run_once:
+        zoning = next(iter(zonings))
+        writer = output_utils.make_writer(output, f"out/{city_name}_zonings.gpkg")
+        model = analyze_zoning(
+            city_name, path_to_shp, 0, zoning, session, output=writer
+        )
+        if writer is not None:
+            writer.close()
+        print(model.is_good_zoning())
+        analyzed_zonings.append(np.asarray(zoning).tolist())
+        results.append(model.is_good_zoning())
 
-    return zonings, results
+        model.save_zoning_stats(f"out/{city_name}_result_0.txt")
+        model.save_all_data("out/all_data.json")
+    else:
+        store = ResultStore(store_path) if store_path is not None else None
+        for _, zoning, _, passed in iter_analyze(
+            city_name,
+            path_to_shp,
+            zonings,
+            workers=workers,
+            sink_path=sink_path,
+            session=session,
+            store=store,
+            output=output,
+        ):
+            print(passed)
+            analyzed_zonings.append(np.asarray(zoning).tolist())
+            results.append(passed)
+        if store is not None:
+            store.close()
+
+    return analyzed_zonings, results
 
 
 if __name__ == "__main__":
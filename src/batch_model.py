@@ -0,0 +1,336 @@
+"""
+Evaluates the compliance model for many zonings at once
+
+`ComplianceModel` goes through the spreadsheet one zoning at a time.
+Here, every parcel is run through the district formulas once for each
+district's parameters, and then each zoning only has to add up the
+rows of its parcels, which NumPy does for all the zonings together
+"""
+
+import numpy as np
+from utils import compliance_utils
+
+INTRODUCTION = "Introduction"
+DISTRICT_ID = "Checklist District ID"
+SUMMARY = "Summary"
+
+N_DISTRICTS = 5
+
+# rows of the `Summary` sheet that are just a district sum, by the
+# name of that sum in `compliance_utils.DISTRICT_SUMS`
+_SUMMARY_ROWS = {
+    6: "X_sum",
+    7: "Y_sum",
+    9: "Z_sum",
+    10: "AA_sum",
+    11: "AC_sum",
+    12: "AB_sum",
+    23: "B11",
+    24: "B12",
+    25: "F10",
+    26: "F9",
+    27: "F11",
+    28: "F12",
+    29: "F13",
+}
+_SUMMARY_COLS = "CDEFG"
+
+
+def district_index(zonings):
+    """
+    Given `zonings` as a (n_plans x n_parcels) array of district labels,
+    returns an array of the same shape with the district (0 to 4) that
+    each parcel is in. Like `process_shapefile`, the labels of each
+    zoning are sorted, and the smallest one is the first district
+
+    Fails if a zoning has more than 5 districts
+    """
+    zonings = np.asarray(zonings)
+    n_plans = zonings.shape[0]
+    rows = np.arange(n_plans)[:, None]
+
+    labels, inverse = np.unique(zonings, return_inverse=True)
+    inverse = inverse.reshape(zonings.shape)
+
+    present = np.zeros((n_plans, len(labels)), dtype=bool)
+    present[rows, inverse] = True
+    if present.sum(axis=1).max(initial=0) > N_DISTRICTS:
+        raise Exception(f"Zonings can have at most {N_DISTRICTS} districts")
+
+    rank = np.cumsum(present, axis=1) - 1
+    return rank[rows, inverse]
+
+
+def parcel_tables(cache, parameter_cells, water_included="N"):
+    """
+    Returns a (5 x n_parcels x len(DISTRICT_SUMS)) array with the
+    `compliance_utils.parcel_contributions` of every parcel for each
+    district's parameters, out of the `DistrictFuncCache` `cache`
+    """
+    return np.stack(
+        [
+            cache.contributions(
+                **compliance_utils.district_parameters(
+                    parameter_cells, i, water_included
+                )
+            )
+            for i in range(1, N_DISTRICTS + 1)
+        ]
+    )
+
+
+def segmented_sums(districts, values, chunk_size=256):
+    """
+    Given `districts` from `district_index` and per-district parcel
+    `values` of shape (5 x n_parcels) or (5 x n_parcels x n_columns),
+    returns the sum over the parcels of each district of each zoning,
+    with shape (n_plans x 5) or (n_plans x 5 x n_columns)
+
+    Zonings are done `chunk_size` at a time to keep memory down
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 2
+    if squeeze:
+        values = values[:, :, None]
+
+    n_plans, n_parcels = districts.shape
+    parcel_idx = np.arange(n_parcels)
+    out = np.zeros((n_plans, N_DISTRICTS, values.shape[2]))
+
+    for start in range(0, n_plans, chunk_size):
+        chunk = districts[start : start + chunk_size]
+        n_chunk = len(chunk)
+        bins = (np.arange(n_chunk)[:, None] * N_DISTRICTS + chunk).ravel()
+
+        for col in range(values.shape[2]):
+            weights = values[chunk, parcel_idx, col].ravel()
+            out[start : start + n_chunk, :, col] = np.bincount(
+                bins, weights=weights, minlength=n_chunk * N_DISTRICTS
+            ).reshape(n_chunk, N_DISTRICTS)
+
+    return out[:, :, 0] if squeeze else out
+
+
+def evaluate_zonings(
+    zonings,
+    parcels_df,
+    community_name,
+    parameter_cells,
+    parcel_area,
+    parcel_stn_area,
+    parcel_ddd=None,
+    water_included="N",
+    cache=None,
+):
+    """
+    Scores all of `zonings`, a (n_plans x n_parcels) array where
+    `zonings[p][j]` is the district label of parcel `j` in zoning `p`
+
+    `parcels_df` has the `District {i}` sheet columns (`G`, `H`, `I`,
+    `L`, and optionally `O`) for every parcel, in the same order as the
+    zonings. `parameter_cells` is the `Checklist Parameters` input
+    (like `parameters.PARAMETERS`). Pass the community's
+    `DistrictFuncCache` as `cache` to reuse it between calls
+
+    `parcel_area`, `parcel_stn_area` and `parcel_ddd` are the acres of
+    each parcel, of each parcel inside a station area, and of each
+    parcel's gross density deduction (0 when not given). District
+    values are the sums of these, so overlapping parcels get counted
+    twice, unlike with a dissolve
+
+    Returns `(sheets, passed)`:
+        * `sheets` maps `Checklist District ID` and `Summary` to dicts
+        of cells, where each cell is an array with one value per zoning
+        (like `ComplianceModel[sheet]`, but for every zoning)
+        * `passed[p]` is `ComplianceModel.is_good_zoning()` for zoning `p`
+    """
+    districts = district_index(zonings)
+    n_plans, n_parcels = districts.shape
+    if len(parcels_df) != n_parcels:
+        raise Exception(
+            f"Zonings have {n_parcels} parcels, but there are {len(parcels_df)}"
+        )
+
+    intro = compliance_utils.get_community_info(community_name)
+    if parcel_ddd is None:
+        parcel_ddd = np.zeros(n_parcels)
+
+    if cache is None:
+        cache = compliance_utils.DistrictFuncCache(parcels_df)
+
+    sums = segmented_sums(
+        districts, parcel_tables(cache, parameter_cells, water_included)
+    )
+    sum_idx = {name: k for k, name in enumerate(compliance_utils.DISTRICT_SUMS)}
+
+    # `Checklist District ID`, rows 54 to 58
+    present = segmented_sums(districts, np.ones((N_DISTRICTS, n_parcels))) > 0
+    # these don't depend on the district's parameters
+    geo_values = np.column_stack([parcel_area, parcel_stn_area, parcel_ddd])
+    geo = segmented_sums(
+        districts, np.broadcast_to(geo_values, (N_DISTRICTS,) + geo_values.shape)
+    )
+    area, stn_area, ddd = (np.where(present, geo[:, :, k], np.nan) for k in range(3))
+
+    district_id = {}
+    for i in range(N_DISTRICTS):
+        district_id[f"B{54 + i}"] = np.where(present[:, i], i, np.nan)
+        district_id[f"C{54 + i}"] = area[:, i]
+        district_id[f"D{54 + i}"] = stn_area[:, i]
+        district_id[f"E{54 + i}"] = ddd[:, i]
+    district_id["C59"] = np.nansum(area, axis=1)
+    district_id["D59"] = np.nansum(stn_area, axis=1)
+    district_id["E59"] = np.nansum(ddd, axis=1)
+    district_id["E70"] = np.full(n_plans, intro["I7"] * intro["I9"])
+    district_id["E71"] = district_id["D59"]
+    district_id["E72"] = district_id["E70"] - district_id["D59"]
+    district_id["E74"] = np.full(n_plans, intro["I6"] * intro["I9"])
+
+    # `Summary`, one column per district, then the `H` totals
+    caps = np.array(
+        [parameter_cells.get(f"{col}103", 0) for col in "EHKNQ"], dtype=float
+    )
+    capped = np.minimum(sums[:, :, sum_idx["B13"]], caps)
+    ddd_or_zero = np.nan_to_num(ddd)
+
+    summary = {}
+    for i, col in enumerate(_SUMMARY_COLS):
+        summary[f"{col}5"] = district_id[f"B{54 + i}"]
+        for row, name in _SUMMARY_ROWS.items():
+            summary[f"{col}{row}"] = sums[:, i, sum_idx[name]]
+        summary[f"{col}8"] = np.full(n_plans, caps[i])
+        summary[f"{col}13"] = capped[:, i]
+        summary[f"{col}18"] = district_id[f"B{54 + i}"]
+        summary[f"{col}19"] = area[:, i]
+        summary[f"{col}20"] = ddd[:, i]
+        summary[f"{col}21"] = capped[:, i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            summary[f"{col}22"] = np.where(
+                ddd_or_zero[:, i] != 0, capped[:, i] / ddd_or_zero[:, i], 0
+            )
+        summary[f"{col}30"] = (
+            sums[:, i, sum_idx["X_sum"]] - sums[:, i, sum_idx["AC_sum"]]
+        )
+
+    for row in list(range(6, 14)) + list(range(23, 31)):
+        summary[f"H{row}"] = sum(summary[f"{col}{row}"] for col in _SUMMARY_COLS)
+    summary["H19"] = district_id["C59"]
+    summary["H20"] = district_id["E59"]
+    summary["H21"] = capped.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary["H22"] = np.where(
+            summary["H20"] != 0, summary["H21"] / summary["H20"], 0
+        )
+
+    passed = _passes(
+        intro,
+        summary["H21"],
+        summary["H19"],
+        summary["H25"],
+        district_id["E71"],
+    )
+
+    return {DISTRICT_ID: district_id, SUMMARY: summary}, passed
+
+
+def evaluate_parameter_sets(
+    zonings,
+    parcels_df,
+    community_name,
+    parameter_sets,
+    parcel_area,
+    parcel_stn_area,
+    water_included="N",
+    sets_per_chunk=8,
+    cache=None,
+):
+    """
+    Like `evaluate_zonings`, but for every zoning with every one of
+    `parameter_sets` (a list of `Checklist Parameters` inputs), only
+    working out what the result needs
+
+    The zonings' districts and areas don't depend on the parameters, so
+    they're only worked out once. Each distinct district's parameters
+    only go through the district formulas once, and the district sums
+    for `sets_per_chunk` parameter sets are done together. Pass the
+    community's `DistrictFuncCache` as `cache` to reuse it between calls
+
+    Returns `(units, passed)`, both (n_sets x n_plans): the unit capacity
+    (`H21`) and `is_good_zoning()` of each zoning with each parameter set
+    """
+    districts = district_index(zonings)
+    n_plans, n_parcels = districts.shape
+    if len(parcels_df) != n_parcels:
+        raise Exception(
+            f"Zonings have {n_parcels} parcels, but there are {len(parcels_df)}"
+        )
+
+    intro = compliance_utils.get_community_info(community_name)
+    if cache is None:
+        cache = compliance_utils.DistrictFuncCache(parcels_df)
+
+    # the total area and station area of the districts, which is all the
+    # result needs from `Checklist District ID`
+    geo_values = np.column_stack([parcel_area, parcel_stn_area])
+    geo = segmented_sums(
+        districts, np.broadcast_to(geo_values, (N_DISTRICTS,) + geo_values.shape)
+    ).sum(axis=1)
+
+    # and from the `District {i}` sheets, `B13` (units) and `F10`
+    # (units in station areas)
+    sum_cols = [
+        compliance_utils.DISTRICT_SUMS.index("B13"),
+        compliance_utils.DISTRICT_SUMS.index("F10"),
+    ]
+
+    def _district_columns(parameter_cells, i):
+        return cache.contributions(
+            **compliance_utils.district_parameters(parameter_cells, i, water_included)
+        )[:, sum_cols]
+
+    n_sets = len(parameter_sets)
+    units = np.zeros((n_sets, n_plans))
+    stn_units = np.zeros((n_sets, n_plans))
+    for start in range(0, n_sets, sets_per_chunk):
+        chunk = parameter_sets[start : start + sets_per_chunk]
+
+        # (5 x n_parcels x (2 * len(chunk))), the two columns of each set
+        # next to each other
+        tables = np.stack(
+            [
+                np.concatenate([_district_columns(cells, i) for cells in chunk], axis=1)
+                for i in range(1, N_DISTRICTS + 1)
+            ]
+        )
+        sums = segmented_sums(districts, tables).reshape(
+            n_plans, N_DISTRICTS, len(chunk), 2
+        )
+
+        caps = np.array(
+            [[cells.get(f"{col}103", 0) for col in "EHKNQ"] for cells in chunk],
+            dtype=float,
+        )
+        capped = np.minimum(sums[:, :, :, 0], caps.T[None])
+        units[start : start + len(chunk)] = capped.sum(axis=1).T
+        stn_units[start : start + len(chunk)] = sums[:, :, :, 1].sum(axis=1).T
+
+    passed = _passes(intro, units, geo[:, 0], stn_units, geo[:, 1])
+    return units, passed
+
+
+def _passes(intro, units, area, stn_units, stn_area):
+    """
+    Same checks as `ComplianceModel.is_good_zoning`, given `H21`, `H19`,
+    `H25` and `E71` (arrays that broadcast together)
+
+    Like in the model, when the community requires no station area (`I9`
+    is 0) the station area ratios are infinite (so they pass) if there's
+    anything in station areas, and NaN (so they don't) otherwise
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (
+            (intro["I6"] < units)
+            & (intro["I7"] < area)
+            & (intro["I9"] < stn_units / (intro["I6"] * intro["I9"]))
+            & (intro["I9"] < stn_area / (intro["I7"] * intro["I9"]))
+        )
@@ -3,38 +3,184 @@ Provides the whole compliance model in Python
 """
 
 import pandas as pd
+import numpy as np
 import json
-from utils import compliance_utils
+from utils import compliance_utils, profile_utils
 
 INTRODUCTION = "Introduction"
 DISTRICT_ID = "Checklist District ID"
 PARAMETERS = "Checklist Parameters"
 SUMMARY = "Summary"
 
+SHEET_NAMES = [
+    INTRODUCTION,
+    DISTRICT_ID,
+    PARAMETERS,
+    "District 1",
+    "District 2",
+    "District 3",
+    "District 4",
+    "District 5",
+    "Zoning Input Summary",
+    SUMMARY,
+]
+
 EMPTY_DF = pd.DataFrame(
     columns=["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M"]
 )
 
 
+# where each cell lives in the arrays of `ComplianceModel`
+INTRODUCTION_CELLS = ["I5", "I6", "I7", "I8", "I9"]
+DISTRICT_ID_COLS = "CDE"
+DISTRICT_ID_TOTALS = ["C59", "D59", "E59", "E70", "E71", "E72", "E74"]
+PARAMETER_COLS = "EHKNQ"
+PARAMETER_ROWS = [16, 22, 24, 25, 35, 43, 58, 60, 86, 101, 102, 103]
+DISTRICT_CELLS = [
+    "B9",
+    "B10",
+    "B11",
+    "B12",
+    "B13",
+    "B14",
+    "F9",
+    "F10",
+    "F11",
+    "F12",
+    "F13",
+    "F14",
+    "X_sum",
+    "Y_sum",
+    "Z_sum",
+    "AA_sum",
+    "AB_sum",
+    "AC_sum",
+    "AE_sum",
+    "AF_sum",
+]
+SUMMARY_COLS = "CDEFGH"
+SUMMARY_ROWS = list(range(5, 14)) + list(range(18, 31))
+
+# counts, which the sheets show as ints
+_INTEGER_CELLS = {"I5", "B10", "F9"} | {f"{col}26" for col in SUMMARY_COLS}
+
+_district_cell_idx = {cell: k for k, cell in enumerate(DISTRICT_CELLS)}
+_district_id_total_idx = {cell: k for k, cell in enumerate(DISTRICT_ID_TOTALS)}
+_district_sum_cols = np.array(
+    [_district_cell_idx[cell] for cell in compliance_utils.DISTRICT_SUMS]
+)
+_b10_sum_idx = compliance_utils.DISTRICT_SUMS.index("B10")
+
+
+def _sum_parts(values):
+    """
+    Splits the column sums of `values` into the sum of the finite values
+    and how many are +inf, -inf and NaN, so that rows can be taken off
+    the sums again (there's no taking an infinite value off)
+    """
+    return np.stack(
+        [
+            np.where(np.isfinite(values), values, 0).sum(axis=0),
+            np.isposinf(values).sum(axis=0),
+            np.isneginf(values).sum(axis=0),
+            np.isnan(values).sum(axis=0),
+        ]
+    )
+
+
+def _parts_total(parts):
+    """
+    Puts the sums split up by `_sum_parts` back together
+    """
+    finite, posinf, neginf, nan = parts
+    total = finite.copy()
+    total[posinf > 0] = np.inf
+    total[neginf > 0] = -np.inf
+    total[(nan > 0) | ((posinf > 0) & (neginf > 0))] = np.nan
+    return total
+
+
+def _cell_value(cell, value):
+    """
+    How a value from the arrays is shown in the sheets
+    """
+    if np.isnan(value):
+        return None
+    if cell in _INTEGER_CELLS:
+        return int(value)
+    return float(value)
+
+
 class ComplianceModel:
     """
     This class corresponds to the MBTA Excel compliance model from
     https://www.mass.gov/info-details/mbta-communities-compliance-model-components
+
+    The numbers are kept in NumPy arrays (one row per district), and the
+    sheets of Excel cells are only put together when asked for with
+    `model[sheet_name]` or `save_all_data`
     """
 
-    def __init__(self):
-        self._big_dict = {
-            "Introduction": {},
-            "Checklist District ID": {},
-            "Checklist Parameters": {},
-            "District 1": {},
-            "District 2": {},
-            "District 3": {},
-            "District 4": {},
-            "District 5": {},
-            "Zoning Input Summary": {},
-            "Summary": {},
-        }
+    def __init__(
+        self,
+        district_func_cache=None,
+        parcel_area=None,
+        parcel_stn_area=None,
+        parcel_ddd=None,
+    ):
+        """
+        `district_func_cache` is an optional `compliance_utils.DistrictFuncCache`
+        for the community. When given, the `District {i}` sheets copy their
+        formulas out of it instead of computing them again
+
+        `parcel_area`, `parcel_stn_area` and `parcel_ddd` are the acres of
+        each parcel of the community, of each parcel inside a station
+        area, and of each parcel's gross density deduction (0 when not
+        given). Give these and `district_func_cache` to be able to use
+        `move_parcels`
+        """
+        self._district_func_cache = district_func_cache
+
+        # for `move_parcels`: the parcel values, the district (1 to 5, or
+        # 0 for none) each parcel is in, each district's rows of
+        # `compliance_utils.parcel_contributions`, and its sums of them
+        # split up by `_sum_parts`
+        self._parcel_values = None
+        self._parcel_district = None
+        if district_func_cache is not None and parcel_area is not None:
+            if parcel_ddd is None:
+                parcel_ddd = np.zeros(len(parcel_area))
+            self._parcel_values = np.column_stack(
+                [parcel_area, parcel_stn_area, parcel_ddd]
+            ).astype(float)
+            self._parcel_district = np.zeros(len(parcel_area), dtype=np.int8)
+        self._contributions = {}
+        self._sum_parts = {}
+
+        # `Introduction`
+        self._community_name = None
+        self._community_category = None
+        self._intro = np.full(len(INTRODUCTION_CELLS), np.nan)
+
+        # `Checklist District ID`, indexed by (district, column)
+        self._water_included = None
+        self._district_names = [None] * 5
+        self._district_id = np.full((5, len(DISTRICT_ID_COLS)), np.nan)
+        self._district_id_totals = np.full(len(DISTRICT_ID_TOTALS), np.nan)
+
+        # `Checklist Parameters`, indexed by (district, row). These can
+        # be `""` (no limit), so they aren't stored as numbers
+        self._parameters = np.zeros((5, len(PARAMETER_ROWS)), dtype=object)
+
+        # `District {i}`
+        self._districts = np.full((5, len(DISTRICT_CELLS)), np.nan)
+
+        # `Summary`, indexed by (column, row)
+        self._summary = np.full((len(SUMMARY_COLS), SUMMARY_ROWS[-1] + 1), np.nan)
+
+        # the sheets that have been filled or populated so far
+        self._filled = set()
+        self._populated = set()
 
     def fill_sheet(self, sheet_name, cell_map):
         """
@@ -56,13 +202,11 @@ class ComplianceModel:
         # TODO: add checks to make sure district info being filled out across
         #       different sheets matches up with districts defined
 
-        _big_dict = self._big_dict
-
         def _fill_introduction(cell_map):
             """
             Requires `cell_map` to map `I3` to the community name.
             """
-            _big_dict[INTRODUCTION]["I3"] = cell_map["I3"]
+            self._community_name = cell_map["I3"]
 
         def _fill_checklist_district_id(cell_map):
             """
@@ -76,19 +220,17 @@ class ComplianceModel:
             # if not "E64" in cell_map and cell_map["E64"] not in ["Y", "N"]:
             #     raise Exception("Expected `E64` to be `Y` or `N`")
 
-            print("here", cell_map)
+            profile_utils.log("fill_checklist_district_id", cell_map=cell_map)
             if not "C43" in cell_map and cell_map["C43"] not in ["Y", "N"]:
                 raise Exception("Expected `C43` to be `Y` or `N`")
 
-            _big_dict[DISTRICT_ID]["C43"] = cell_map["C43"]
+            self._water_included = cell_map["C43"]
 
-            for cell in [
-                f"{x}{y}" for x in ["B", "C", "D", "E"] for y in [54, 55, 56, 57, 58]
-            ]:
-                if cell in cell_map:
-                    _big_dict[DISTRICT_ID][cell] = cell_map[cell]
-                else:
-                    _big_dict[DISTRICT_ID][cell] = None
+            for i in range(5):
+                self._district_names[i] = cell_map.get(f"B{54 + i}")
+                for k, col in enumerate(DISTRICT_ID_COLS):
+                    value = cell_map.get(f"{col}{54 + i}")
+                    self._district_id[i, k] = np.nan if value is None else value
 
         def _fill_checklist_parameters(cell_map):
             """
@@ -107,17 +249,12 @@ class ComplianceModel:
                 * `102`
                 * `103`
             """
-            for row in [16, 22, 24, 25, 35, 43, 58, 60, 86, 101, 102, 103]:
-                cell = f"E{row}"
-                _big_dict[PARAMETERS][cell] = cell_map[cell]
-
-            for col in "HKNQ":
-                for row in [16, 22, 24, 25, 35, 43, 58, 60, 86, 101, 102, 103]:
-                    cell = f"{col}{row}"
-                    if cell in cell_map:
-                        _big_dict[PARAMETERS][cell] = cell_map[cell]
-                    else:
-                        _big_dict[PARAMETERS][cell] = 0
+            for k, row in enumerate(PARAMETER_ROWS):
+                self._parameters[0, k] = cell_map[f"E{row}"]
+
+            for i, col in enumerate(PARAMETER_COLS[1:], start=1):
+                for k, row in enumerate(PARAMETER_ROWS):
+                    self._parameters[i, k] = cell_map.get(f"{col}{row}", 0)
 
         def _fill_district_i(i, df):
             """
@@ -125,16 +262,19 @@ class ComplianceModel:
             """
             return
 
-        if sheet_name == "Introduction":
-            _fill_introduction(cell_map)
-        elif sheet_name == "Checklist District ID":
-            _fill_checklist_district_id(cell_map)
-        elif sheet_name == "Checklist Parameters":
-            _fill_checklist_parameters(cell_map)
-        elif sheet_name.split(" ")[0] == "District":
-            _fill_district_i(int(sheet_name.split(" ")[1]), cell_map)
-        else:
-            raise Exception(f"Sheet `{sheet_name}` not found")
+        with profile_utils.stage("fill_sheet", sheet=sheet_name):
+            if sheet_name == "Introduction":
+                _fill_introduction(cell_map)
+            elif sheet_name == "Checklist District ID":
+                _fill_checklist_district_id(cell_map)
+            elif sheet_name == "Checklist Parameters":
+                _fill_checklist_parameters(cell_map)
+            elif sheet_name.split(" ")[0] == "District":
+                _fill_district_i(int(sheet_name.split(" ")[1]), cell_map)
+            else:
+                raise Exception(f"Sheet `{sheet_name}` not found")
+
+        self._filled.add(sheet_name)
 
     def populate_sheet(self, sheet_name, df=EMPTY_DF.copy()):
         """
@@ -145,186 +285,246 @@ class ComplianceModel:
         is supposed to be filled out in. fails otherwise
         """
 
-        _big_dict = self._big_dict
-
         def populate_introduction():
-            _big_dict["Introduction"] |= compliance_utils.get_community_info(
-                _big_dict["Introduction"]["I3"]
-            )
+            info = compliance_utils.get_community_info(self._community_name)
+            self._community_category = info["I4"]
+            self._intro[:] = [info[cell] for cell in INTRODUCTION_CELLS]
 
         def populate_checklist_district_id():
-            for col in "CDE":
-                _big_dict["Checklist District ID"][f"{col}59"] = sum(
-                    filter(
-                        lambda x: x is not None,
-                        [
-                            _big_dict["Checklist District ID"][f"{col}{row}"]
-                            for row in range(54, 59)
-                        ],
-                    )
-                )
-
-            _big_dict[DISTRICT_ID]["E70"] = (
-                _big_dict[INTRODUCTION]["I7"] * _big_dict[INTRODUCTION]["I9"]
-            )
-            _big_dict[DISTRICT_ID]["E71"] = _big_dict[DISTRICT_ID]["D59"]
-            _big_dict[DISTRICT_ID]["E72"] = (
-                _big_dict[DISTRICT_ID]["E70"] - _big_dict[DISTRICT_ID]["D59"]
-            )
-            _big_dict[DISTRICT_ID]["E74"] = (
-                _big_dict[INTRODUCTION]["I6"] * _big_dict[INTRODUCTION]["I9"]
-            )
+            self._update_district_id_totals()
 
         def populate_checklist_parameters():
             return
 
         def populate_district_i(i, df):
             # TODO: check rounding for AC and X columns
-            district = f"District {i}"
-            parameter_col_map = {1: "E", 2: "H", 3: "K", 4: "N", 5: "Q"}
-            parameter_sheet_col = parameter_col_map[i]
-
-            compliance_utils.apply_district_funcs(
+            apply_district_funcs = (
+                self._district_func_cache.apply_district_funcs
+                if self._district_func_cache is not None
+                else compliance_utils.apply_district_funcs
+            )
+            apply_district_funcs(
                 df,
-                water_included=_big_dict[DISTRICT_ID]["C43"],
-                max_units_per_lot=_big_dict[PARAMETERS][f"{parameter_sheet_col}16"],
-                min_lot_size=_big_dict[PARAMETERS][f"{parameter_sheet_col}22"],
-                base_min_lot_size=_big_dict[PARAMETERS][f"{parameter_sheet_col}24"],
-                additional_lot_SF=_big_dict[PARAMETERS][f"{parameter_sheet_col}25"],
-                building_height=_big_dict[PARAMETERS][f"{parameter_sheet_col}35"],
-                FAR=_big_dict[PARAMETERS][f"{parameter_sheet_col}43"],
-                max_lot_coverage=_big_dict[PARAMETERS][f"{parameter_sheet_col}58"],
-                min_required_open_space=_big_dict[PARAMETERS][
-                    f"{parameter_sheet_col}60"
-                ],
-                parking_spaces_per_unit=_big_dict[PARAMETERS][
-                    f"{parameter_sheet_col}86"
-                ],
-                lot_area_per_dwelling_unit=_big_dict[PARAMETERS][
-                    f"{parameter_sheet_col}101"
-                ],
-                max_dwelling_units_per_acre=_big_dict[PARAMETERS][
-                    f"{parameter_sheet_col}102"
-                ],
+                **compliance_utils.district_parameters(
+                    self._parameter_cells(i), i, self._water_included
+                ),
             )
 
-            _big_dict[district]["B9"] = _big_dict[DISTRICT_ID][f"E{54 + i-1}"]
-            _big_dict[district]["B10"] = len(df)
-            _big_dict[district]["B11"] = sum(df["H"])
-            _big_dict[district]["B12"] = sum(df["W"])
-            _big_dict[district]["B13"] = sum(df["AF"])
-            _big_dict[district]["B14"] = (
-                _big_dict[district]["B13"] / _big_dict[district]["B9"]
-                if _big_dict[district]["B9"]
-                else 0
+            if df.attrs.get("sheet_mode") != "join":
+                # `A` isn't the parcel's row, so there's no telling which
+                # parcels are in the district
+                self._parcel_district = None
+            if self._parcel_district is not None:
+                self._parcel_district[self._parcel_district == i] = 0
+                self._parcel_district[df["A"].to_numpy(dtype=int)] = i
+            self._sum_parts.pop(i, None)
+
+            self._districts[i - 1, _district_sum_cols] = compliance_utils.district_sums(
+                df
             )
-            _big_dict[district]["F9"] = len(df.query("AD == 'Y'"))
-            _big_dict[district]["F10"] = sum(df.query("G == 'Y'")["AF"])
-            _big_dict[district]["F11"] = sum(df["L"])
-            _big_dict[district]["F12"] = sum(df["T"])
-            _big_dict[district]["F13"] = sum(df.query("U > 0")["U"])
-            _big_dict[district]["F14"] = sum(df["X"]) - sum(df["AC"])
-
-            # additional stuff needed to populate the summary page T_T
-            _big_dict[district]["X_sum"] = sum(df["X"])
-            _big_dict[district]["Y_sum"] = sum(df["Y"])
-            _big_dict[district]["Z_sum"] = sum(df["Z"])
-            _big_dict[district]["AA_sum"] = sum(df["AA"])
-            _big_dict[district]["AB_sum"] = sum(df["AB"])
-            _big_dict[district]["AC_sum"] = sum(df["AC"])
-            _big_dict[district]["AE_sum"] = sum(df["AE"])
-            _big_dict[district]["AF_sum"] = sum(df["AF"])
+            self._update_district_cells(i)
 
         def populate_summary():
-            col_map = {1: "C", 2: "D", 3: "E", 4: "F", 5: "G"}
-            parameter_col_map = {1: "E", 2: "H", 3: "K", 4: "N", 5: "Q"}
-
-            for i in range(1, 6):
-                parameter_sheet_col = parameter_col_map[i]
-                col = col_map[i]
-                district = f"District {i}"
-
-                _big_dict[SUMMARY][f"{col}5"] = _big_dict[DISTRICT_ID][f"B{54 + i-1}"]
-                _big_dict[SUMMARY][f"{col}6"] = _big_dict[district]["X_sum"]
-                _big_dict[SUMMARY][f"{col}7"] = _big_dict[district]["Y_sum"]
-                _big_dict[SUMMARY][f"{col}8"] = _big_dict[PARAMETERS][
-                    f"{parameter_sheet_col}103"
-                ]
-                _big_dict[SUMMARY][f"{col}9"] = _big_dict[district]["Z_sum"]
-                _big_dict[SUMMARY][f"{col}10"] = _big_dict[district]["AA_sum"]
-                _big_dict[SUMMARY][f"{col}11"] = _big_dict[district]["AC_sum"]
-                _big_dict[SUMMARY][f"{col}12"] = _big_dict[district]["AB_sum"]
-                _big_dict[SUMMARY][f"{col}13"] = min(
-                    _big_dict[district]["B13"], _big_dict[SUMMARY][f"{col}8"]
+            missing = [
+                f"District {i}"
+                for i in range(1, 6)
+                if f"District {i}" not in self._populated
+            ]
+            if missing:
+                raise Exception(f"{', '.join(missing)} must be populated first")
+
+            self._update_summary()
+
+        with profile_utils.stage("populate_sheet", sheet=sheet_name):
+            if sheet_name == "Introduction":
+                populate_introduction()
+            elif sheet_name == "Checklist District ID":
+                populate_checklist_district_id()
+            elif sheet_name == "Checklist Parameters":
+                populate_checklist_parameters()
+            elif sheet_name.split(" ")[0] == "District":
+                populate_district_i(int(sheet_name.split(" ")[1]), df)
+            elif sheet_name == "Summary":
+                populate_summary()
+
+        self._populated.add(sheet_name)
+
+    def move_parcels(self, parcel_ids, from_district, to_district):
+        """
+        Moves the parcels at rows `parcel_ids` of the shapefile from
+        `District {from_district}` to `District {to_district}` (1 to 5),
+        and returns `is_good_zoning()` for the new zoning
+
+        Only the moved parcels are looked at: their rows of the
+        `DistrictFuncCache` contributions and their areas are taken off
+        one district's sums and added to the other's, and the totals and
+        the `Summary` are redone from the district sums. So the model
+        has to have been made with `district_func_cache` and the parcel
+        areas, and populated up to the `Summary`
+
+        The moved districts' areas become sums of parcel areas (like in
+        `batch_model`), so they can be a little off from a dissolve
+
+        A district that's left empty keeps its number, so the districts
+        after it keep their parameters. `process_shapefile` numbers the
+        districts of a zoning in order instead, so analyzing the new
+        zoning from scratch only gives the same results when no district
+        but the last one is emptied
+
+        Fails if any of the parcels isn't in `District {from_district}`
+        """
+        if self._parcel_district is None:
+            raise Exception(
+                "The model needs `district_func_cache`, the parcel areas and "
+                '`District {i}` sheets from `sheet_mode="join"` to move parcels'
+            )
+        if SUMMARY not in self._populated:
+            raise Exception("The model has to be populated before moving parcels")
+
+        parcel_ids = np.unique(np.asarray(parcel_ids, dtype=int))
+        if np.any(self._parcel_district[parcel_ids] != from_district):
+            raise Exception(f"Not all of the parcels are in District {from_district}")
+        if from_district == to_district:
+            return self.is_good_zoning()
+
+        parts, moved_parts = {}, {}
+        for i in (from_district, to_district):
+            parts[i] = self._district_sum_parts(i)
+            moved_parts[i] = _sum_parts(self._district_contributions(i)[parcel_ids])
+        moved_values = self._parcel_values[parcel_ids].sum(axis=0)
+        self._parcel_district[parcel_ids] = to_district
+
+        for i, sign in [(from_district, -1), (to_district, 1)]:
+            parts[i] += sign * moved_parts[i]
+            empty = parts[i][0, _b10_sum_idx] == 0
+            if empty:
+                # so that nothing is left over from the finite sums
+                parts[i][:] = 0
+            self._districts[i - 1, _district_sum_cols] = _parts_total(parts[i])
+
+            if empty:
+                # like `process_shapefile`, empty districts aren't listed
+                self._district_names[i - 1] = None
+                self._district_id[i - 1] = np.nan
+            else:
+                if self._district_names[i - 1] is None:
+                    self._district_names[i - 1] = i - 1
+                self._district_id[i - 1] = (
+                    np.nan_to_num(self._district_id[i - 1]) + sign * moved_values
                 )
+            self._update_district_cells(i)
 
-                _big_dict[SUMMARY][f"{col}18"] = _big_dict[DISTRICT_ID][f"B{54 + i-1}"]
-                _big_dict[SUMMARY][f"{col}19"] = _big_dict[DISTRICT_ID][f"C{54 + i-1}"]
-                _big_dict[SUMMARY][f"{col}20"] = _big_dict[DISTRICT_ID][f"E{54 + i-1}"]
-                _big_dict[SUMMARY][f"{col}21"] = _big_dict[SUMMARY][f"{col}13"]
-                _big_dict[SUMMARY][f"{col}22"] = (
-                    _big_dict[SUMMARY][f"{col}21"] / _big_dict[SUMMARY][f"{col}20"]
-                    if _big_dict[SUMMARY][f"{col}20"]
-                    else 0
-                )
-                _big_dict[SUMMARY][f"{col}23"] = _big_dict[district]["B11"]
-                _big_dict[SUMMARY][f"{col}24"] = _big_dict[district]["B12"]
-                _big_dict[SUMMARY][f"{col}25"] = _big_dict[district]["F10"]
-                _big_dict[SUMMARY][f"{col}26"] = _big_dict[district]["F9"]
-                _big_dict[SUMMARY][f"{col}27"] = _big_dict[district]["F11"]
-                _big_dict[SUMMARY][f"{col}28"] = _big_dict[district]["F12"]
-                _big_dict[SUMMARY][f"{col}29"] = _big_dict[district]["F13"]
-                _big_dict[SUMMARY][f"{col}30"] = _big_dict[district]["F14"]
-
-            for row in range(6, 14):
-                _big_dict[SUMMARY][f"H{row}"] = sum(
-                    filter(
-                        lambda x: x is not None,
-                        [_big_dict[SUMMARY][f"{col_map[i]}{row}"] for i in range(1, 6)],
-                    )
-                )
+        self._update_district_id_totals()
+        self._update_summary()
+        return self.is_good_zoning()
 
-            _big_dict[SUMMARY]["H19"] = sum(
-                filter(
-                    lambda x: x is not None,
-                    [_big_dict[SUMMARY][f"{col_map[i]}19"] for i in range(1, 6)],
-                )
+    def _district_sum_parts(self, i):
+        """
+        Returns the `_sum_parts` of the rows of `_district_contributions(i)`
+        of the parcels in district `i`, worked out the first time it's
+        needed and then kept up to date by `move_parcels`
+        """
+        if i not in self._sum_parts:
+            self._sum_parts[i] = _sum_parts(
+                self._district_contributions(i)[self._parcel_district == i]
             )
-            _big_dict[SUMMARY]["H20"] = _big_dict[DISTRICT_ID]["E59"]
-            _big_dict[SUMMARY]["H21"] = sum(
-                filter(
-                    lambda x: x is not None,
-                    [_big_dict[SUMMARY][f"{col_map[i]}21"] for i in range(1, 6)],
+        return self._sum_parts[i]
+
+    def _district_contributions(self, i):
+        """
+        Returns `compliance_utils.parcel_contributions` of every parcel of
+        the community with district `i`'s parameters
+        """
+        if i not in self._contributions:
+            self._contributions[i] = self._district_func_cache.contributions(
+                **compliance_utils.district_parameters(
+                    self._parameter_cells(i), i, self._water_included
                 )
             )
-            _big_dict[SUMMARY]["H22"] = (
-                _big_dict[SUMMARY]["H21"] / _big_dict[SUMMARY]["H20"]
-                if _big_dict[SUMMARY]["H20"]
-                else 0
-            )
+        return self._contributions[i]
 
-            for row in range(23, 31):
-                _big_dict[SUMMARY][f"H{row}"] = sum(
-                    filter(
-                        lambda x: x is not None,
-                        [_big_dict[SUMMARY][f"{col_map[i]}{row}"] for i in range(1, 6)],
-                    )
-                )
+    def _update_district_id_totals(self):
+        """
+        Redoes the `Checklist District ID` cells computed from the districts
+        """
+        totals = self._district_id_totals
+        totals[:3] = np.nansum(self._district_id, axis=0)
 
-        if sheet_name == "Introduction":
-            populate_introduction()
-        elif sheet_name == "Checklist District ID":
-            populate_checklist_district_id()
-        elif sheet_name == "Checklist Parameters":
-            populate_checklist_parameters()
-        elif sheet_name.split(" ")[0] == "District":
-            populate_district_i(int(sheet_name.split(" ")[1]), df)
-        elif sheet_name == "Summary":
-            populate_summary()
+        i6, i7, i9 = self._intro_values("I6", "I7", "I9")
+        totals[_district_id_total_idx["E70"]] = i7 * i9
+        totals[_district_id_total_idx["E71"]] = totals[1]
+        totals[_district_id_total_idx["E72"]] = i7 * i9 - totals[1]
+        totals[_district_id_total_idx["E74"]] = i6 * i9
+
+    def _update_district_cells(self, i):
+        """
+        Redoes the cells of `District {i}` that aren't parcel sums
+        """
+        row = self._districts[i - 1]
+        d = _district_cell_idx
+
+        row[d["B9"]] = self._district_id[i - 1, DISTRICT_ID_COLS.index("E")]
+        row[d["B14"]] = (
+            row[d["B13"]] / row[d["B9"]]
+            if not np.isnan(row[d["B9"]]) and row[d["B9"]]
+            else 0
+        )
+        row[d["F14"]] = row[d["X_sum"]] - row[d["AC_sum"]]
+
+    def _update_summary(self):
+        """
+        Redoes the whole `Summary` from the other sheets
+        """
+        districts = self._districts
+        summary = self._summary
+        d = _district_cell_idx
+
+        # the district columns, `C` to `G`
+        caps = self._parameters[:, PARAMETER_ROWS.index(103)].astype(float)
+        area = self._district_id[:, DISTRICT_ID_COLS.index("C")]
+        ddd = self._district_id[:, DISTRICT_ID_COLS.index("E")]
+
+        summary[:5, 6] = districts[:, d["X_sum"]]
+        summary[:5, 7] = districts[:, d["Y_sum"]]
+        summary[:5, 8] = caps
+        summary[:5, 9] = districts[:, d["Z_sum"]]
+        summary[:5, 10] = districts[:, d["AA_sum"]]
+        summary[:5, 11] = districts[:, d["AC_sum"]]
+        summary[:5, 12] = districts[:, d["AB_sum"]]
+        summary[:5, 13] = np.minimum(districts[:, d["B13"]], caps)
+
+        summary[:5, 19] = area
+        summary[:5, 20] = ddd
+        summary[:5, 21] = summary[:5, 13]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            summary[:5, 22] = np.where(
+                np.nan_to_num(ddd) != 0, summary[:5, 21] / ddd, 0
+            )
+        summary[:5, 23] = districts[:, d["B11"]]
+        summary[:5, 24] = districts[:, d["B12"]]
+        summary[:5, 25] = districts[:, d["F10"]]
+        summary[:5, 26] = districts[:, d["F9"]]
+        summary[:5, 27] = districts[:, d["F11"]]
+        summary[:5, 28] = districts[:, d["F12"]]
+        summary[:5, 29] = districts[:, d["F13"]]
+        summary[:5, 30] = districts[:, d["F14"]]
+
+        # the totals, `H`
+        summary[5, 6:14] = summary[:5, 6:14].sum(axis=0)
+        summary[5, 19] = np.nansum(area)
+        summary[5, 20] = self._district_id_totals[_district_id_total_idx["E59"]]
+        summary[5, 21] = summary[:5, 21].sum()
+        summary[5, 22] = summary[5, 21] / summary[5, 20] if summary[5, 20] else 0
+        summary[5, 23:31] = summary[:5, 23:31].sum(axis=0)
 
     def save_all_data(self, path_to_file):
         with open(path_to_file, "w") as f:
-            json.dump(self._big_dict, f, indent=4, default=str)
+            json.dump(
+                {sheet_name: self[sheet_name] for sheet_name in SHEET_NAMES},
+                f,
+                indent=4,
+                default=str,
+            )
 
     # a method to output the metrics that show _why_ a zoning is good (if needed)
     # usually you wouldn't want to use this other than debugging
@@ -369,42 +569,132 @@ class ComplianceModel:
         * % land area located in transit station areas
         """
 
-        def comparator(left, right):
-            """
-            returns True iff self[INTRODUCTION][left] < self[SUMMARY][right])
-            """
-            return self[INTRODUCTION][left] < self[SUMMARY][right]
+        required, modeled = self._requirements()
+
+        passes = required < modeled
 
-        try:
-            # all of these are just defined as in the excel sheet
-            min_multi_family_unit_capacity = comparator("I6", "H21")
-            min_land_area = comparator("I7", "H19")
-            developable_station_area = True
+        # all of these are just defined as in the excel sheet
+        min_multi_family_unit_capacity = passes[0]
+        min_land_area = passes[1]
+        developable_station_area = True
+        unit_capacity_ratio_within_station_area = passes[2]
+        land_area_ratio_within_station_area = passes[3]
 
+        return bool(
+            min_multi_family_unit_capacity
+            and min_land_area
+            and developable_station_area
+            and unit_capacity_ratio_within_station_area
+            and land_area_ratio_within_station_area
+        )
+
+    def compliance_slack(self):
+        """
+        Returns how far past each of the requirements that `is_good_zoning`
+        checks the zoning is, as a fraction of the requirement: unit
+        capacity (`I6`), land area (`I7`), and the unit capacity and land
+        area ratios in station areas (`I9`)
+
+        The zoning is good iff all of these are above 0. Ratios that the
+        model can't compute (like when `I9` is 0 and nothing is in a
+        station area) count as -1
+        """
+        required, modeled = self._requirements()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slack = (modeled - required) / np.where(required, required, 1)
+        return np.where(np.isnan(slack), -1.0, slack)
+
+    def _requirements(self):
+        """
+        Returns `(required, modeled)`, the arrays of what `is_good_zoning`
+        compares
+        """
+        if SUMMARY not in self._populated:
+            raise Exception("You haven't provided all relevant details to the model")
+
+        i6, i7, i9 = self._intro_values("I6", "I7", "I9")
+        units, area, stn_units = self._summary[SUMMARY_COLS.index("H"), [21, 19, 25]]
+        stn_area = self._district_id_totals[_district_id_total_idx["E71"]]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
             # extra work unfortunately
-            unit_capacity_ratio_within_station_area = self[INTRODUCTION]["I9"] < (
-                self[SUMMARY]["H25"]
-                / (self[INTRODUCTION]["I6"] * self[INTRODUCTION]["I9"])
-            )
-            land_area_ratio_within_station_area = self[INTRODUCTION]["I9"] < (
-                self[DISTRICT_ID]["E71"]
-                / (self[INTRODUCTION]["I7"] * self[INTRODUCTION]["I9"])
+            modeled = np.array(
+                [units, area, stn_units / (i6 * i9), stn_area / (i7 * i9)]
             )
+        return np.array([i6, i7, i9, i9]), modeled
 
-            return bool(
-                min_multi_family_unit_capacity
-                and min_land_area
-                and developable_station_area
-                and unit_capacity_ratio_within_station_area
-                and land_area_ratio_within_station_area
-            )
-        except:
-            raise Exception("You haven't provided all relevant details to the model")
+    def _intro_values(self, *cells):
+        """
+        Returns the values of the `Introduction` `cells` (from `I5` to `I9`)
+        """
+        return tuple(self._intro[INTRODUCTION_CELLS.index(cell)] for cell in cells)
+
+    def _parameter_cells(self, i):
+        """
+        Returns the `Checklist Parameters` cells of district `i` (1 to 5)
+        """
+        col = PARAMETER_COLS[i - 1]
+        return {
+            f"{col}{row}": value
+            for row, value in zip(PARAMETER_ROWS, self._parameters[i - 1])
+        }
 
     def __getitem__(self, sheet_name):
         """
-        Try to get a sheet from the model. Returns a copy
+        Try to get a sheet from the model, as a dict of Excel cells.
+        These are put together from the arrays each time, so changing
+        them doesn't change the model
 
         Fails if the sheet doesn't exist
         """
-        return self._big_dict[sheet_name].copy()
+        if sheet_name not in SHEET_NAMES:
+            raise KeyError(sheet_name)
+
+        sheet = {}
+        if sheet_name == INTRODUCTION:
+            if INTRODUCTION in self._filled:
+                sheet["I3"] = self._community_name
+            if INTRODUCTION in self._populated:
+                sheet["I4"] = self._community_category
+                for cell, value in zip(INTRODUCTION_CELLS, self._intro):
+                    sheet[cell] = _cell_value(cell, value)
+
+        elif sheet_name == DISTRICT_ID:
+            if DISTRICT_ID in self._filled:
+                sheet["C43"] = self._water_included
+                for i in range(5):
+                    sheet[f"B{54 + i}"] = self._district_names[i]
+                for k, col in enumerate(DISTRICT_ID_COLS):
+                    for i in range(5):
+                        sheet[f"{col}{54 + i}"] = _cell_value(
+                            col, self._district_id[i, k]
+                        )
+            if DISTRICT_ID in self._populated:
+                for cell, value in zip(DISTRICT_ID_TOTALS, self._district_id_totals):
+                    sheet[cell] = _cell_value(cell, value)
+
+        elif sheet_name == PARAMETERS:
+            if PARAMETERS in self._filled:
+                for i in range(1, 6):
+                    sheet |= self._parameter_cells(i)
+
+        elif sheet_name.startswith("District "):
+            if sheet_name in self._populated:
+                i = int(sheet_name.split(" ")[1])
+                for cell, value in zip(DISTRICT_CELLS, self._districts[i - 1]):
+                    sheet[cell] = _cell_value(cell, value)
+
+        elif sheet_name == SUMMARY:
+            if SUMMARY in self._populated:
+                for c, col in enumerate(SUMMARY_COLS):
+                    for row in SUMMARY_ROWS:
+                        if col == "H" and row in [5, 18]:
+                            continue
+                        if row in [5, 18]:
+                            sheet[f"{col}{row}"] = self._district_names[c]
+                        else:
+                            sheet[f"{col}{row}"] = _cell_value(
+                                f"{col}{row}", self._summary[c, row]
+                            )
+
+        return sheet
@@ -0,0 +1,186 @@
+"""
+Searches for zonings that pass the compliance model, instead of making
+zonings and hoping that some of them pass
+
+Starting from a contiguous zoning, parcels on the border of a district
+are moved to the district next to them, one at a time (simulated
+annealing). Each zoning is scored by how far it falls short of the
+requirements in `ComplianceModel.compliance_slack`, and the model is
+updated with `ComplianceModel.move_parcels`, so a step only costs as
+much as the parcel being moved. Every district stays contiguous
+"""
+
+from collections import deque
+import numpy as np
+
+
+def shortfall(slack):
+    """
+    Given `compliance_slack()`, returns how far the zoning is from
+    passing: the sum of the requirements it misses by. 0 iff it passes
+    (up to requirements it only just meets)
+    """
+    return -np.minimum(slack, 0).sum()
+
+
+class ZoningSearch:
+    """
+    Moves parcels of `plan` (an array with the district, 1 to 5, of every
+    parcel) between districts, keeping `model` up to date with it
+
+    `model` has to be a `ComplianceModel` that was filled for `plan` and
+    can `move_parcels`. `adjacency` is from `zoner.parcel_adjacency`
+    """
+
+    def __init__(self, model, adjacency, plan):
+        self._model = model
+        self._indptr, self._indices = adjacency
+        self._plan = np.asarray(plan, dtype=np.int8).copy()
+        self._sizes = np.bincount(self._plan, minlength=6)
+
+        n = len(self._plan)
+        u = np.repeat(np.arange(n), np.diff(self._indptr))
+        keep = u < self._indices
+        self._edge_u, self._edge_v = u[keep], self._indices[keep]
+
+        self.slack = model.compliance_slack()
+        self.shortfall = shortfall(self.slack)
+
+    @property
+    def plan(self):
+        """
+        A copy of the current zoning
+        """
+        return self._plan.copy()
+
+    def _stays_connected(self, parcel):
+        """
+        Whether the district of `parcel` is still connected without it.
+        Only searches until the parcel's neighbors in the district all
+        reach each other, which is usually right around it
+        """
+        plan = self._plan
+        district = plan[parcel]
+        neighbors = self._indices[self._indptr[parcel] : self._indptr[parcel + 1]]
+        same = neighbors[plan[neighbors] == district]
+        if len(same) <= 1:
+            return True
+
+        unreached = set(same[1:].tolist())
+        seen = {parcel, same[0]}
+        queue = deque([same[0]])
+        while queue and unreached:
+            node = queue.popleft()
+            for neighbor in self._indices[
+                self._indptr[node] : self._indptr[node + 1]
+            ].tolist():
+                if neighbor not in seen and plan[neighbor] == district:
+                    seen.add(neighbor)
+                    unreached.discard(neighbor)
+                    queue.append(neighbor)
+        return not unreached
+
+    def _random_move(self, rng, attempts=50):
+        """
+        Returns a random `(parcel, to_district)` that moves a parcel on a
+        district border, or None if the zoning has only one district
+        """
+        plan = self._plan
+        for _ in range(attempts):
+            edge = rng.integers(len(self._edge_u))
+            if plan[self._edge_u[edge]] != plan[self._edge_v[edge]]:
+                break
+        else:
+            # borders are rare, so look them all up
+            cut_edges = np.flatnonzero(plan[self._edge_u] != plan[self._edge_v])
+            if not len(cut_edges):
+                return None
+            edge = cut_edges[rng.integers(len(cut_edges))]
+
+        u, v = self._edge_u[edge], self._edge_v[edge]
+        if rng.random() < 0.5:
+            u, v = v, u
+        return u, plan[v]
+
+    def step(self, rng, temperature):
+        """
+        Tries to move a random border parcel to the district next to it.
+        The move is kept if it doesn't leave the zoning further from
+        passing, or otherwise with probability
+        `exp(-(increase in shortfall) / temperature)`
+
+        Moves that would empty a district or split it in two aren't
+        tried. Returns whether the zoning changed
+        """
+        move = self._random_move(rng)
+        if move is None:
+            return False
+        parcel, to_district = move
+        from_district = self._plan[parcel]
+        if self._sizes[from_district] <= 1 or not self._stays_connected(parcel):
+            return False
+
+        self._model.move_parcels([parcel], from_district, to_district)
+        slack = self._model.compliance_slack()
+        new_shortfall = shortfall(slack)
+
+        increase = new_shortfall - self.shortfall
+        if increase > 0 and (
+            temperature <= 0 or rng.random() >= np.exp(-increase / temperature)
+        ):
+            self._model.move_parcels([parcel], to_district, from_district)
+            return False
+
+        self._plan[parcel] = to_district
+        self._sizes[from_district] -= 1
+        self._sizes[to_district] += 1
+        self.slack, self.shortfall = slack, new_shortfall
+        return True
+
+
+def search_plans(
+    model,
+    adjacency,
+    plan,
+    n_plans,
+    seed=None,
+    max_steps=100000,
+    temperature=0.05,
+    cooling=0.9995,
+    min_temperature=1e-4,
+    thin=100,
+):
+    """
+    Yields up to `n_plans` different zonings that pass the compliance
+    model, found with a `ZoningSearch` from `plan` (see there for
+    `model` and `adjacency`). Each is an array with the district of
+    every parcel, like from `zoner.generate_plans`
+
+    The temperature starts at `temperature` and is multiplied by
+    `cooling` every step, down to `min_temperature`. Once the search
+    has found a passing zoning, it keeps moving parcels around (among
+    passing zonings, mostly), and only yields another one after at
+    least `thin` more moves, so they aren't all nearly the same
+
+    Stops after `max_steps` steps, even if fewer zonings were found
+    """
+    rng = np.random.default_rng(seed)
+    search = ZoningSearch(model, adjacency, plan)
+
+    found = 0
+    seen = set()
+    moves_since_found = thin
+    for step in range(max_steps):
+        if found >= n_plans:
+            return
+
+        if search.step(rng, max(temperature * cooling**step, min_temperature)):
+            moves_since_found += 1
+
+        if moves_since_found >= thin and np.all(search.slack > 0):
+            key = search.plan.tobytes()
+            if key not in seen:
+                seen.add(key)
+                found += 1
+                moves_since_found = 0
+                yield search.plan
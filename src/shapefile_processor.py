@@ -3,12 +3,12 @@ Once zoned, this file is used to pre-process stuff and
 get information to use in the compliance model
 """
 
-import os
-import zipfile
+from functools import cached_property
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from utils import shapefile_utils
-from utils.calc_layers import HALF_MILE_GDF, GDDD_GDF
+from utils import shapefile_utils, compliance_utils, hash_utils, output_utils
+from utils import calc_layers, parcel_cache, profile_utils
 
 EMPTY_DF = pd.DataFrame(
     columns=["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M"]
@@ -30,17 +30,229 @@ column_name_mapper = {
     "Tot_Sensit": "M",
 }
 
+# the `District <x>` sheet columns that the model uses, and how they're
+# kept. The text columns aren't needed, and the numbers that get summed
+# stay float64 so that the sums don't change
+SHEET_DTYPES = {
+    "A": np.int32,
+    "G": "category",
+    "H": np.float64,
+    "I": np.float64,
+    "L": np.float64,
+    "O": np.float64,
+}
+
+# the same, by the shapefile's names for the columns, for `parcel_cache`
+CACHE_DTYPES = {
+    name: SHEET_DTYPES[col]
+    for name, col in column_name_mapper.items()
+    if col in SHEET_DTYPES
+}
+
+
+def lean_parcels(parcels_df):
+    """
+    Given `parcels_df` with the `District <x>` sheet columns, returns
+    just the ones in `SHEET_DTYPES` (that it has), with those dtypes
+    """
+    columns = [col for col in SHEET_DTYPES if col in parcels_df.columns]
+    return parcels_df[columns].astype({col: SHEET_DTYPES[col] for col in columns})
+
+
+class CommunitySession:
+    """
+    Everything about a community's parcel layer that stays the same
+    from one zoning to the next. Build one of these per run and pass
+    it to `process_shapefile` so the shapefile is only read (and
+    projected) once, instead of once per zoning
+
+    `city_shp_file_path` is the path to the zipfile containing all the
+    shapefile stuff needed
+
+    `land_map_gdf` is the parcel layer in the NAD83 MA projection,
+    `parcel_area` holds the area of each parcel in acres, and
+    `parcel_stn_area` the acres of each parcel inside a station area.
+    `parcels_df` has the `District <x>` sheet columns of every parcel
+    (only the ones the model uses, see `lean_parcels`),
+    and `district_func_cache` is a `compliance_utils.DistrictFuncCache`
+    over it, for the `District <x>` sheets that `"join"` makes
+
+    When zonings aren't dissolved, a district's area is the sum of its
+    parcels' areas. With `overlap_correction`, land that several parcels
+    of the same district cover is only counted once, like a dissolve
+    would (see `district_areas`)
+
+    With `use_parcel_cache`, the parcels are read from the
+    `utils.parcel_cache` of the shapefile (made the first time), which
+    only has the columns in `column_name_mapper`
+    """
+
+    def __init__(
+        self, city_shp_file_path, overlap_correction=False, use_parcel_cache=False
+    ):
+        self.city_shp_file_path = city_shp_file_path
+        self.overlap_correction = overlap_correction
+
+        if use_parcel_cache:
+            land_map_gdf = parcel_cache.read_parcels(
+                parcel_cache.cached(
+                    city_shp_file_path, column_name_mapper, CACHE_DTYPES
+                )
+            )
+            self.parcel_area = land_map_gdf.pop("area")
+            self.parcel_stn_area = land_map_gdf.pop("stn_area")
+            self.land_map_gdf = land_map_gdf
+        else:
+            land_map_gdf = shapefile_utils.area_projection(
+                gpd.read_file(city_shp_file_path), drop=False
+            )
+            self.parcel_area = land_map_gdf.pop("area")
+            self.land_map_gdf = land_map_gdf
+
+            # a district's station area is just the sum of its parcels', so
+            # it only has to be worked out once per parcel instead of once
+            # per zoning
+            self.parcel_stn_area = pd.Series(
+                shapefile_utils.parcel_station_area(
+                    land_map_gdf,
+                    calc_layers.half_mile_gdf(bbox=land_map_gdf.total_bounds),
+                ),
+                index=land_map_gdf.index,
+            )
+
+        self.parcels_df = lean_parcels(
+            land_map_gdf.drop(columns="geometry")
+            .reset_index()
+            .rename(columns=column_name_mapper)
+        )
+        self.district_func_cache = compliance_utils.DistrictFuncCache(self.parcels_df)
+
+    @cached_property
+    def shapefile_hash(self):
+        """
+        Hash of the shapefile's contents, for caching things computed
+        from it
+        """
+        return hash_utils.file_hash(self.city_shp_file_path)
+
+    @cached_property
+    def parcel_overlaps(self):
+        """
+        `shapefile_utils.parcel_overlaps` of the parcels
+        """
+        return shapefile_utils.parcel_overlaps(self.land_map_gdf)
+
+    def district_areas(self, zone_ids):
+        """
+        Given `zone_ids` (a Series with the district of each parcel),
+        returns the acres of each district without dissolving anything,
+        sorted by district
+
+        With `overlap_correction`, only the parcels that overlap another
+        parcel of their district get merged (the overlapping pairs are
+        found once, the first time it's needed), and the area counted
+        more than once is taken off
+        """
+        areas = self.parcel_area.groupby(zone_ids, sort=True).sum()
+
+        if self.overlap_correction:
+            left, right, _ = self.parcel_overlaps
+            zones = zone_ids.to_numpy()
+            same = zones[left] == zones[right]
+            overlapping = np.unique(np.concatenate([left[same], right[same]]))
+            if len(overlapping):
+                extra = shapefile_utils.overlap_acres(
+                    self.land_map_gdf.iloc[overlapping], zones[overlapping]
+                )
+                areas = areas.sub(extra, fill_value=0)
+
+        return areas
+
+    def __len__(self):
+        return len(self.land_map_gdf)
 
-def process_shapefile(city_shp_file_path, zoning, output_filename):
+
+class CommunityAttributes:
+    """
+    The parts of a `CommunitySession` that don't need the parcels'
+    geometry: `parcels_df`, `parcel_area`, `parcel_stn_area` and
+    `district_func_cache`. That's all `batch_model` and `sweep` need
+
+    They're read from the `utils.parcel_cache` of the shapefile at
+    `city_shp_file_path` (made the first time, which does read the
+    geometry), without decoding any geometry
+    """
+
+    def __init__(self, city_shp_file_path):
+        self.city_shp_file_path = city_shp_file_path
+
+        parcels = parcel_cache.read_attributes(
+            parcel_cache.cached(city_shp_file_path, column_name_mapper, CACHE_DTYPES)
+        )
+        self.parcel_area = parcels.pop("area")
+        self.parcel_stn_area = parcels.pop("stn_area")
+
+        self.parcels_df = lean_parcels(
+            parcels.reset_index().rename(columns=column_name_mapper)
+        )
+        self.district_func_cache = compliance_utils.DistrictFuncCache(self.parcels_df)
+
+    @cached_property
+    def shapefile_hash(self):
+        """
+        Hash of the shapefile's contents, for caching things computed
+        from it
+        """
+        return hash_utils.file_hash(self.city_shp_file_path)
+
+    def __len__(self):
+        return len(self.parcels_df)
+
+
+def process_shapefile(
+    city_shp_file_path,
+    zoning,
+    output_filename,
+    session=None,
+    sheet_mode="join",
+    output="zip",
+    dissolve=None,
+):
     """
     `city_shp_file_path` is the path to the zipfile containing all the
     shapefile stuff needed
 
+    `session` is an optional `CommunitySession` for the same shapefile.
+    When given, the parcels are taken from it instead of being read
+    from `city_shp_file_path` again
+
     `zoning` should be provided as a list, where `zoning[i]` gives the
     district number that is assigned to parcel `i`
 
+    `sheet_mode` picks how the `District <x>` sheets are made
+        * `"join"` (default) puts each parcel in the district that
+        `zoning` assigns it to. Column `A` is the parcel's row in the
+        shapefile, and only the columns the model uses are there
+        * `"overlay"` intersects the parcels with each dissolved
+        district, like the compliance user guide does. Much slower,
+        but useful to validate `"join"` against
+        Anything else fails
+
     Creates a shapefile named `output_filename` at `output_path`
 
+    `output` picks what happens to that shapefile
+        * `"zip"` (default) saves it zipped into `{output_filename}.zip`
+        * None doesn't save it at all
+        * a writer from `utils.output_utils` gets it passed to its
+        `write` method (to save it on another thread, or all zonings
+        into one file, ...)
+
+    `dissolve` picks whether the districts get merged into polygons.
+    By default that only happens when they're needed (for `output`, or
+    for `"overlay"`). Otherwise district areas are the sums of their
+    parcels' areas (see `CommunitySession.district_areas`), which is
+    much faster. The districts then come back without geometry
+
     Returns
         * a dict which can be used with the Excel Compliance Model
         object
@@ -88,10 +300,31 @@ def process_shapefile(city_shp_file_path, zoning, output_filename):
 
         return district_sheets
 
+    def _join_district_sheets(parcels_df, zoning):
+        """
+        Same as `_return_district_sheets`, but only uses `zoning` to
+        decide which parcels go in which district (no geometry work).
+        The sheets only have the columns of `parcels_df`, and are marked
+        with `attrs["sheet_mode"]`, since only then is `A` the parcel's row
+        """
+        district_sheets = {f"District {i}": EMPTY_DF.copy() for i in range(1, 6)}
+
+        zone_ids = pd.Series(zoning, index=parcels_df.index)
+
+        # sorted like `dissolve` sorts them, so the district numbers match
+        for idx, (_, district_df) in enumerate(parcels_df.groupby(zone_ids, sort=True)):
+            sheet_name = f"District {idx+1}"
+            district_sheets[sheet_name] = district_df.reset_index(drop=True)
+
+        for sheet in district_sheets.values():
+            sheet.attrs["sheet_mode"] = "join"
+        return district_sheets
+
     def _return_district_summaries(final_zoning_gdf):
-        final_zoning_gdf = shapefile_utils.area_projection(
-            final_zoning_gdf.copy(), drop=False
-        )
+        if "geometry" in final_zoning_gdf.columns:
+            final_zoning_gdf = shapefile_utils.area_projection(
+                final_zoning_gdf.copy(), drop=False
+            )
 
         sheet_name = "Checklist District ID"
         ret = {sheet_name: {}}
@@ -105,39 +338,51 @@ def process_shapefile(city_shp_file_path, zoning, output_filename):
 
         return ret
 
-    def _save_result_shp_file(final_zoning_gdf, name=output_filename):
-        temp_dir = "temp_shapefiles"  # Separate temporary directory
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Create shapefiles in temp_dir
-        output_shapefile = f"{temp_dir}/zoned.shp"
-        final_zoning_gdf.to_file(output_shapefile)
+    ## ACTUAL CODE STARTS
+    if sheet_mode not in ["join", "overlay"]:
+        raise Exception(f"Unknown sheet mode `{sheet_mode}`")
 
-        # Create ZIP in final output location (not in temp_dir)
-        zip_output_path = f"{name}.zip"  # Not inside temp_dir
-        with zipfile.ZipFile(zip_output_path, "w") as zipf:
-            for file in os.listdir(temp_dir):
-                zipf.write(os.path.join(temp_dir, file), arcname=file)
+    if session is None:
+        with profile_utils.stage("load_session"):
+            session = CommunitySession(city_shp_file_path)
+    land_map_gdf = session.land_map_gdf
+    # land_map_gdf = land_map_gdf.query("Owner == 'MASSACHUSETTS INSTITUTE OF TECHNOLOGY'")
 
-        # Cleanup temp directory
-        for file in os.listdir(temp_dir):
-            os.remove(os.path.join(temp_dir, file))
-        os.rmdir(temp_dir)
+    zone_ids = pd.Series(zoning, index=land_map_gdf.index)
+    if dissolve is None:
+        dissolve = output is not None or sheet_mode == "overlay"
 
-    ## ACTUAL CODE STARTS
-    land_map_gdf = gpd.read_file(city_shp_file_path)
-    # land_map_gdf = land_map_gdf.query("Owner == 'MASSACHUSETTS INSTITUTE OF TECHNOLOGY'")
+    if dissolve:
+        with profile_utils.stage("dissolve"):
+            # only the geometry is needed to make the zones, so there's no
+            # point copying every attribute for each zoning
+            gdf = land_map_gdf[["geometry"]].copy()
+            final_zoning_gdf = _divide_into_zones(gdf, zoning)
+    else:
+        with profile_utils.stage("district_areas"):
+            final_zoning_gdf = pd.DataFrame(
+                {"area": session.district_areas(zone_ids).to_numpy()}
+            )
 
-    gdf = land_map_gdf.copy()
-    final_zoning_gdf = shapefile_utils.gross_ddd_thing(
-        shapefile_utils.area_intersection(
-            _divide_into_zones(gdf, zoning), HALF_MILE_GDF
+    with profile_utils.stage("station_areas"):
+        final_zoning_gdf["stn_area"] = (
+            session.parcel_stn_area.groupby(zone_ids, sort=True).sum().to_numpy()
         )
-    )
+        final_zoning_gdf = shapefile_utils.gross_ddd_thing(final_zoning_gdf)
+
+    with profile_utils.stage("output"):
+        if output == "zip":
+            output_utils.save_zipped_shapefile(final_zoning_gdf, output_filename)
+        elif output is not None:
+            output.write(output_filename, final_zoning_gdf)
 
-    _save_result_shp_file(final_zoning_gdf)
+    with profile_utils.stage("district_sheets", sheet_mode=sheet_mode):
+        if sheet_mode == "overlay":
+            district_sheets = _return_district_sheets(final_zoning_gdf, land_map_gdf)
+        else:
+            district_sheets = _join_district_sheets(session.parcels_df, zoning)
 
     return (
         _return_district_summaries(final_zoning_gdf),
-        _return_district_sheets(final_zoning_gdf, land_map_gdf),
+        district_sheets,
     )
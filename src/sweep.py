@@ -0,0 +1,178 @@
+"""
+Tries many `Checklist Parameters` on the same zonings, to see which
+parameters make which zonings pass
+
+The parameters to change are given as ranges of values for any of the
+`parameters.PARAMETERS` cells (like `E43`, the FAR of the first
+district). Every combination of them can be tried (`parameter_grid`),
+or just a sample that still covers each range evenly
+(`latin_hypercube`). The shapefile is only processed once, and all the
+parameter sets are scored together with `batch_model`
+
+Can also be run from the top of the repo:
+    python -m src.sweep --community Cambridge --shapefile community.zip \\
+        --zonings zonings.npy --vary E43=0.5,0.9,1.2 --vary E35=3,5,10
+"""
+
+import json
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from src.shapefile_processor import CommunitySession, CommunityAttributes
+from src.batch_model import evaluate_parameter_sets
+from utils import zoning_store
+from parameters import PARAMETERS
+
+
+def _check_cells(cells, base):
+    for cell in cells:
+        if cell not in base:
+            raise Exception(f"`{cell}` is not one of the parameters")
+
+
+def parameter_grid(ranges, base=PARAMETERS):
+    """
+    Returns one parameter set for every combination of the values in
+    `ranges`, which maps cells to lists of values. Cells not in `ranges`
+    keep their value from `base`
+    """
+    _check_cells(ranges, base)
+    cells = list(ranges)
+    return [
+        base | dict(zip(cells, values))
+        for values in itertools.product(*(ranges[cell] for cell in cells))
+    ]
+
+
+def latin_hypercube(bounds, n_sets, base=PARAMETERS, seed=None):
+    """
+    Returns `n_sets` parameter sets, where `bounds` maps cells to the
+    `(low, high)` range of their values. Each range is cut into `n_sets`
+    equal pieces, and every piece gets used by exactly one set, with the
+    pieces of different cells paired up at random. Cells not in `bounds`
+    keep their value from `base`
+    """
+    _check_cells(bounds, base)
+    rng = np.random.default_rng(seed)
+    parameter_sets = [dict(base) for _ in range(n_sets)]
+    for cell, (low, high) in bounds.items():
+        points = (rng.permutation(n_sets) + rng.random(n_sets)) / n_sets
+        for parameter_cells, point in zip(parameter_sets, points):
+            parameter_cells[cell] = float(low + point * (high - low))
+    return parameter_sets
+
+
+def sweep(session, community_name, zonings, parameter_sets, water_included="N"):
+    """
+    Scores every one of `zonings` with every one of `parameter_sets` for
+    the community in `session` (a `CommunitySession`, or a
+    `CommunityAttributes`)
+
+    Returns a table with one row per (zoning, parameter set): their
+    positions in `zonings` and `parameter_sets` (`plan` and
+    `parameter_set`), the values of the cells that differ between the
+    parameter sets, the unit capacity (`H21` of the `Summary`) and
+    whether the zoning passes
+    """
+    units, passed = evaluate_parameter_sets(
+        np.asarray(zonings),
+        session.parcels_df,
+        community_name,
+        parameter_sets,
+        session.parcel_area.to_numpy(),
+        session.parcel_stn_area.to_numpy(),
+        water_included=water_included,
+        cache=session.district_func_cache,
+    )
+    n_sets, n_plans = units.shape
+
+    table = pd.DataFrame(
+        {
+            "plan": np.tile(np.arange(n_plans), n_sets),
+            "parameter_set": np.repeat(np.arange(n_sets), n_plans),
+        }
+    )
+    for cell in parameter_sets[0]:
+        values = [parameter_cells[cell] for parameter_cells in parameter_sets]
+        if len(set(values)) > 1:
+            table[cell] = np.repeat(values, n_plans)
+    table["unit_capacity"] = units.ravel()
+    table["passed"] = passed.ravel()
+
+    return table
+
+
+def _parse_vary(arguments, latin):
+    """
+    Turns each `CELL=a,b,c` (or `CELL=low:high` for `latin`) of
+    `arguments` into `{CELL: [a, b, c]}` (or `{CELL: (low, high)}`)
+    """
+    ranges = {}
+    for argument in arguments:
+        cell, _, values = argument.partition("=")
+        if latin:
+            low, high = values.split(":")
+            ranges[cell] = (float(low), float(high))
+        else:
+            ranges[cell] = [json.loads(value) for value in values.split(",")]
+    return ranges
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--community", required=True)
+    parser.add_argument("--shapefile", required=True)
+    parser.add_argument(
+        "--zonings",
+        required=True,
+        help="a zoning store (`.npy`, see `utils.zoning_store`) "
+        "or a JSON file with a list of zonings",
+    )
+    parser.add_argument(
+        "--vary",
+        action="append",
+        required=True,
+        help="`CELL=a,b,c` to try each of those values, "
+        "or `CELL=low:high` with `--latin`",
+    )
+    parser.add_argument(
+        "--latin",
+        type=int,
+        metavar="N",
+        help="try N parameter sets from a Latin hypercube instead of every combination",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--water-included", default="N")
+    parser.add_argument("--out", default="out/sweep.csv")
+    parser.add_argument(
+        "--parcel-cache",
+        action="store_true",
+        help="read the parcels from their columnar cache (needs pyarrow)",
+    )
+    args = parser.parse_args()
+
+    ranges = _parse_vary(args.vary, args.latin is not None)
+    if args.latin is not None:
+        parameter_sets = latin_hypercube(ranges, args.latin, seed=args.seed)
+    else:
+        parameter_sets = parameter_grid(ranges)
+
+    zonings = zoning_store.load_zonings(args.zonings)
+
+    session = (
+        CommunityAttributes(args.shapefile)
+        if args.parcel_cache
+        else CommunitySession(args.shapefile)
+    )
+    table = sweep(
+        session,
+        args.community,
+        zonings,
+        parameter_sets,
+        water_included=args.water_included,
+    )
+    table.to_csv(args.out, index=False)
+    print(
+        f"{table['passed'].sum()} of {len(table)} (zoning, parameter set) pairs passed"
+    )
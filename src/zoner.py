@@ -0,0 +1,399 @@
+"""
+Python version of `zoner.r`: makes zonings out of a community's parcels,
+without having to start R
+
+Parcels are connected like in `zoner.r` (touching within a snap distance,
+then disconnected pieces joined to their nearest neighbor). Zonings are
+made with a ReCom Markov chain: two neighboring districts are merged, a
+random spanning tree is drawn over them, and the tree is cut into two
+new districts. Every district stays contiguous
+"""
+
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+from utils import io_utils
+
+# what the worker processes need from `generate_plans`. Set right before
+# the workers are forked, so the graph never gets pickled
+_WORKER_STATE = {}
+
+
+def parcel_adjacency(gdf, snap=0.001):
+    """
+    Given the parcels in `gdf` (in a projection in meters), returns their
+    adjacency as `(indptr, indices)`, in compressed sparse row form: the
+    neighbors of parcel `i` are `indices[indptr[i]:indptr[i + 1]]`
+
+    Like `poly2nb(shp, snap = snap)` followed by `connect_subgraphs` in
+    `zoner.r`: parcels are neighbors if they are within `snap` of each
+    other, and then each piece of the graph that isn't connected to the
+    rest is joined to its nearest parcel outside of it. The result is
+    always symmetric
+    """
+    geometries = gdf.geometry.values
+    tree = shapely.STRtree(geometries)
+    left, right = tree.query(geometries, predicate="dwithin", distance=snap)
+    keep = left != right
+    edges = np.column_stack([left[keep], right[keep]])
+
+    edges = _connect_components(edges, len(gdf), gdf.geometry.centroid.values)
+
+    return _to_csr(edges, len(gdf))
+
+
+def cached_parcel_adjacency(gdf, shapefile_hash, cache_dir="cache", snap=0.001):
+    """
+    Same as `parcel_adjacency`, but saved to `cache_dir` the first time,
+    keyed by `shapefile_hash` (the hash of the shapefile `gdf` was read
+    from) and `snap`. Later calls for the same shapefile just load it
+    """
+    path = os.path.join(cache_dir, f"adjacency_{shapefile_hash}_{snap}.npz")
+    if os.path.exists(path):
+        with np.load(path) as saved:
+            return saved["indptr"], saved["indices"]
+
+    indptr, indices = parcel_adjacency(gdf, snap=snap)
+
+    with io_utils.atomic_write(path) as temp_path:
+        np.savez(temp_path, indptr=indptr, indices=indices)
+
+    return indptr, indices
+
+
+def _to_csr(edges, n):
+    """
+    Turns the `edges` pairs into a symmetric `(indptr, indices)` for `n`
+    parcels, with no repeated neighbors
+    """
+    edges = np.concatenate([edges, edges[:, ::-1]])
+    edges = np.unique(edges, axis=0) if len(edges) else edges.reshape(0, 2)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n), out=indptr[1:])
+    return indptr, edges[:, 1].astype(np.int32)
+
+
+def _components(edges, n):
+    """
+    Returns the connected component label of each of the `n` parcels
+    """
+    parent = np.arange(n)
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for u, v in edges:
+        root_u, root_v = _find(u), _find(v)
+        if root_u != root_v:
+            parent[root_u] = root_v
+
+    return np.array([_find(i) for i in range(n)])
+
+
+def _connect_components(edges, n, centroids):
+    """
+    Adds edges to `edges` until the graph of the `n` parcels is connected,
+    by joining the smallest piece to the parcel closest to it (by
+    centroid) in any other piece, over and over
+    """
+    edges = [edges]
+    components = _components(edges[0], n)
+
+    while len(np.unique(components)) > 1:
+        labels, counts = np.unique(components, return_counts=True)
+        inside = components == labels[np.argmin(counts)]
+        inside_idx = np.flatnonzero(inside)
+        outside_idx = np.flatnonzero(~inside)
+
+        tree = shapely.STRtree(centroids[outside_idx])
+        (near_in, near_out), distances = tree.query_nearest(
+            centroids[inside_idx], return_distance=True
+        )
+        best = np.argmin(distances)
+        u, v = inside_idx[near_in[best]], outside_idx[near_out[best]]
+
+        edges.append(np.array([[u, v]]))
+        components[components == components[u]] = components[v]
+
+    return np.concatenate(edges)
+
+
+class PlanGenerator:
+    """
+    Makes contiguous zonings with `n_districts` districts out of the
+    parcels connected by `adjacency` (from `parcel_adjacency`)
+
+    Each parcel counts `pop[i]` (1 if not given, like in `zoner.r`)
+    towards its district's population, and every district's population
+    has to be within `pop_tol` (as a ratio) of the average. The default
+    of 1 is the same as in `zoner.r`, and lets districts be anywhere
+    from empty to double the average
+    """
+
+    def __init__(self, adjacency, n_districts, pop=None, pop_tol=1.0):
+        indptr, indices = adjacency
+        self.n = len(indptr) - 1
+        self.n_districts = n_districts
+        self.pop = np.ones(self.n) if pop is None else np.asarray(pop, dtype=float)
+
+        ideal = self.pop.sum() / n_districts
+        self.min_pop = ideal * (1 - pop_tol)
+        self.max_pop = ideal * (1 + pop_tol)
+
+        # each edge once, as (u, v) with u < v
+        rows = np.repeat(np.arange(self.n), np.diff(indptr))
+        keep = rows < indices
+        self._edge_u = rows[keep]
+        self._edge_v = indices[keep].astype(np.int64)
+
+    def _spanning_tree(self, nodes, rng):
+        """
+        Draws a random spanning tree over the parcels in `nodes` (which
+        have to be connected). Returns `(order, parent)`: the parcels in
+        breadth-first order from the root, and the parent of each parcel
+        in the tree (-1 for the root)
+        """
+        in_region = np.zeros(self.n, dtype=bool)
+        in_region[nodes] = True
+        keep = in_region[self._edge_u] & in_region[self._edge_v]
+        edge_u, edge_v = self._edge_u[keep], self._edge_v[keep]
+
+        # Kruskal's algorithm with random edge weights
+        union = {node: node for node in nodes.tolist()}
+
+        def _find(i):
+            while union[i] != i:
+                union[i] = union[union[i]]
+                i = union[i]
+            return i
+
+        neighbors = {node: [] for node in nodes.tolist()}
+        n_tree_edges = 0
+        for k in rng.permutation(len(edge_u)).tolist():
+            u, v = int(edge_u[k]), int(edge_v[k])
+            root_u, root_v = _find(u), _find(v)
+            if root_u == root_v:
+                continue
+            union[root_u] = root_v
+            neighbors[u].append(v)
+            neighbors[v].append(u)
+            n_tree_edges += 1
+            if n_tree_edges == len(nodes) - 1:
+                break
+
+        root = int(nodes[rng.integers(len(nodes))])
+        parent = {root: -1}
+        order = [root]
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for neighbor in neighbors[node]:
+                if neighbor not in parent:
+                    parent[neighbor] = node
+                    order.append(neighbor)
+                    queue.append(neighbor)
+
+        return order, parent
+
+    def _split(self, nodes, n_rest, rng, attempts=100):
+        """
+        Tries to cut the parcels in `nodes` into one district, and the rest
+        holding the right population for `n_rest` more districts. Returns
+        the parcels of the new district, or None if no cut was found in
+        `attempts` spanning trees
+        """
+        total = self.pop[nodes].sum()
+
+        for _ in range(attempts):
+            order, parent = self._spanning_tree(nodes, rng)
+
+            subtree_pop = {node: self.pop[node] for node in order}
+            for node in reversed(order[1:]):
+                subtree_pop[parent[node]] += subtree_pop[node]
+
+            candidates = [
+                node
+                for node in order[1:]
+                if self.min_pop <= subtree_pop[node] <= self.max_pop
+                and n_rest * self.min_pop
+                <= total - subtree_pop[node]
+                <= n_rest * self.max_pop
+            ]
+            if not candidates:
+                continue
+
+            cut = candidates[rng.integers(len(candidates))]
+            children = {}
+            for node in order[1:]:
+                children.setdefault(parent[node], []).append(node)
+
+            part = [cut]
+            for node in part:
+                part.extend(children.get(node, []))
+            return np.array(part)
+
+        return None
+
+    def initial_plan(self, rng, attempts=100):
+        """
+        Makes a first zoning by cutting districts off a spanning tree one
+        at a time. Returns the district (1 to `n_districts`) of each parcel
+        """
+        for _ in range(attempts):
+            plan = np.zeros(self.n, dtype=np.int64)
+            rest = np.arange(self.n)
+            for district in range(1, self.n_districts):
+                part = self._split(rest, self.n_districts - district, rng, attempts=10)
+                if part is None:
+                    break
+                plan[part] = district
+                rest = np.flatnonzero(plan == 0)
+            else:
+                plan[rest] = self.n_districts
+                return plan
+
+        raise Exception("Couldn't find a first zoning within the population bounds")
+
+    def recom_step(self, plan, rng):
+        """
+        Does one ReCom step on `plan`: merges two neighboring districts
+        and splits them again along a random spanning tree. Returns the
+        new plan (or `plan` itself if no split was found)
+        """
+        cut_edges = np.flatnonzero(plan[self._edge_u] != plan[self._edge_v])
+        if not len(cut_edges):
+            return plan
+
+        edge = cut_edges[rng.integers(len(cut_edges))]
+        first, second = plan[self._edge_u[edge]], plan[self._edge_v[edge]]
+        nodes = np.flatnonzero((plan == first) | (plan == second))
+
+        part = self._split(nodes, 1, rng, attempts=1)
+        if part is None:
+            return plan
+
+        new_plan = plan.copy()
+        new_plan[nodes] = second
+        new_plan[part] = first
+        return new_plan
+
+    def chain(self, plan, rng, n_plans, thin=1):
+        """
+        Runs the chain from `plan`, and returns the next `n_plans` plans,
+        keeping one every `thin` steps
+        """
+        plans = []
+        for _ in range(n_plans):
+            for _ in range(thin):
+                plan = self.recom_step(plan, rng)
+            plans.append(plan)
+        return plans
+
+
+def _run_chain_in_worker(plan, rng, n_plans, thin):
+    """
+    `PlanGenerator.chain` in a worker process, using the generator that
+    `generate_plans` left in `_WORKER_STATE`. Also sends back the random
+    generator, so the chain can pick up where it left off
+    """
+    plans = _WORKER_STATE["generator"].chain(plan, rng, n_plans, thin)
+    return plans, rng
+
+
+def generate_plans(
+    adjacency,
+    n_districts,
+    n_plans,
+    pop=None,
+    pop_tol=1.0,
+    seed=None,
+    chains=1,
+    workers=1,
+    burn_in=0,
+    thin=1,
+    batch_size=10,
+):
+    """
+    Yields `n_plans` zonings of the parcels connected by `adjacency`, each
+    an array with the district (1 to `n_districts`) of every parcel. See
+    `PlanGenerator` for `pop` and `pop_tol`
+
+    Plans come from `chains` independent ReCom chains (taking turns),
+    each starting from its own first plan. The first `burn_in` steps of
+    every chain are thrown out, and after that one plan is kept every
+    `thin` steps. The same `seed` always gives the same plans, no matter
+    how many `workers` there are
+
+    With `workers` above 1, chains run in that many forked processes,
+    `batch_size` plans at a time. Plans are only made as they're needed,
+    so this can feed straight into `iter_analyze`
+    """
+    generator = PlanGenerator(adjacency, n_districts, pop=pop, pop_tol=pop_tol)
+    rngs = [
+        np.random.default_rng(child)
+        for child in np.random.SeedSequence(seed).spawn(chains)
+    ]
+    plans = [generator.initial_plan(rng) for rng in rngs]
+    remaining = [n_plans // chains + (k < n_plans % chains) for k in range(chains)]
+
+    if workers <= 1:
+        if burn_in:
+            for k in range(chains):
+                plans[k] = generator.chain(plans[k], rngs[k], 1, burn_in)[-1]
+
+        while any(remaining):
+            for k in range(chains):
+                n = min(batch_size, remaining[k])
+                if not n:
+                    continue
+                batch = generator.chain(plans[k], rngs[k], n, thin)
+                plans[k] = batch[-1]
+                remaining[k] -= n
+                yield from batch
+        return
+
+    _WORKER_STATE["generator"] = generator
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    )
+    try:
+        if burn_in:
+            futures = [
+                executor.submit(_run_chain_in_worker, plans[k], rngs[k], 1, burn_in)
+                for k in range(chains)
+            ]
+            for k, future in enumerate(futures):
+                batch, rngs[k] = future.result()
+                plans[k] = batch[-1]
+
+        # keep every chain busy with its next batch while yielding this one
+        futures = {}
+
+        def _submit(k):
+            n = min(batch_size, remaining[k])
+            if n:
+                remaining[k] -= n
+                futures[k] = executor.submit(
+                    _run_chain_in_worker, plans[k], rngs[k], n, thin
+                )
+
+        for k in range(chains):
+            _submit(k)
+        while futures:
+            for k in range(chains):
+                if k not in futures:
+                    continue
+                batch, rngs[k] = futures.pop(k).result()
+                plans[k] = batch[-1]
+                _submit(k)
+                yield from batch
+    finally:
+        executor.shutdown(cancel_futures=True)
+        _WORKER_STATE.clear()
@@ -3,7 +3,6 @@ library(spdep)
 library(bigDM)
 library(redist)
 library(dplyr)
-library(jsonlite)
 
 
 zone <- function(absolute_path, n_districts) {
@@ -73,8 +72,5 @@ zone <- function(absolute_path, n_districts) {
 
     ret <- t(attributes(plans)$plans)
 
-    zonings <- toJSON(ret)
-    write(zonings, file="cached.json")
-
     ret
 }
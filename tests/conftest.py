@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+# the compliance model reads `./resources` when it's imported
+os.chdir(ROOT)
+
+import synthetic
+from utils import calc_layers, parcel_cache
+
+
+@pytest.fixture
+def community(tmp_path, monkeypatch):
+    """
+    Returns a function that saves a made up community (see
+    `synthetic.make_community`) in a temporary directory, points the
+    station layer and the caches there, and returns
+    `(community_path, parcels_gdf)`
+
+    Given `parcels_gdf`, those parcels are saved instead of the grid
+    """
+
+    def _make(n_parcels=100, n_stations=2, seed=0, parcels_gdf=None):
+        community_path, half_mile_path, parcels = synthetic.make_community(
+            str(tmp_path), n_parcels, n_stations=n_stations, seed=seed
+        )
+        if parcels_gdf is not None:
+            parcels = parcels_gdf
+            synthetic.save_zipped(
+                parcels.drop(columns=["row", "col"], errors="ignore"), community_path
+            )
+
+        monkeypatch.setattr(calc_layers, "HALF_MILE_PATH", half_mile_path)
+        monkeypatch.setattr(calc_layers, "CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(parcel_cache, "CACHE_DIR", str(tmp_path / "cache"))
+        return community_path, parcels
+
+    return _make
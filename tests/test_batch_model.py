@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import synthetic
+import interface
+from src.batch_model import evaluate_zonings, evaluate_parameter_sets
+from src.shapefile_processor import CommunitySession
+from utils import compliance_utils
+from test_model_pins import PINS
+
+
+def _parameter_cells(parameters):
+    if parameters == "three_districts":
+        # districts 4 and 5 left out, which `parameters.py` allows
+        return {
+            cell: value
+            for cell, value in PINS["parameters"]["strict"].items()
+            if cell[0] not in "NQ"
+        }
+    return PINS["parameters"][parameters]
+
+
+@pytest.mark.parametrize("city", ["Cambridge", "Arlington"])
+@pytest.mark.parametrize("parameters", ["default", "strict", "three_districts"])
+def test_matches_the_model(community, monkeypatch, city, parameters):
+    parameter_cells = _parameter_cells(parameters)
+    monkeypatch.setitem(
+        interface.INITIALIZATIONS, interface.CHECKLIST_PARAMETERS, parameter_cells
+    )
+    path, parcels = community(n_parcels=200, n_stations=2, seed=0)
+    session = CommunitySession(path)
+    zonings = np.array(synthetic.band_zonings(parcels, 3, 5, seed=0))
+
+    sheets, passed = evaluate_zonings(
+        zonings,
+        session.parcels_df,
+        city,
+        parameter_cells,
+        session.parcel_area.to_numpy(),
+        session.parcel_stn_area.to_numpy(),
+        cache=session.district_func_cache,
+    )
+    units, set_passed = evaluate_parameter_sets(
+        zonings,
+        session.parcels_df,
+        city,
+        [parameter_cells],
+        session.parcel_area.to_numpy(),
+        session.parcel_stn_area.to_numpy(),
+        cache=session.district_func_cache,
+    )
+
+    for p, zoning in enumerate(zonings):
+        model = interface.analyze_zoning(city, path, p, zoning, session, output=None)
+        assert passed[p] == model.is_good_zoning()
+        assert set_passed[0, p] == model.is_good_zoning()
+        assert units[0, p] == pytest.approx(model["Summary"]["H21"], rel=1e-9)
+
+        for sheet, cells in sheets.items():
+            expected = model[sheet]
+            for cell, values in cells.items():
+                # empty cells are NaN here
+                value = np.nan if expected[cell] is None else expected[cell]
+                assert values[p] == pytest.approx(
+                    value, rel=1e-9, abs=1e-9, nan_ok=True
+                ), (sheet, cell)
+
+
+def test_parameter_sets_keep_few_tables(community):
+    path, parcels = community(n_parcels=200, n_stations=2, seed=0)
+    session = CommunitySession(path)
+    zonings = np.array(synthetic.band_zonings(parcels, 3, 5, seed=0))
+    parameter_sets = [
+        dict(PINS["parameters"]["strict"], E43=far, H43=far / 2)
+        for far in np.linspace(0.5, 2, 10)
+    ]
+
+    def _evaluate(cache):
+        return evaluate_parameter_sets(
+            zonings,
+            session.parcels_df,
+            "Cambridge",
+            parameter_sets,
+            session.parcel_area.to_numpy(),
+            session.parcel_stn_area.to_numpy(),
+            cache=cache,
+        )
+
+    cache = compliance_utils.DistrictFuncCache(session.parcels_df, max_tables=4)
+    units, passed = _evaluate(cache)
+    expected_units, expected_passed = _evaluate(None)
+
+    assert len(cache._tables) <= 4 and len(cache._contributions) <= 4
+    np.testing.assert_array_equal(units, expected_units)
+    np.testing.assert_array_equal(passed, expected_passed)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import shapely
+import pytest
+
+import synthetic
+from src.shapefile_processor import CommunitySession
+from utils.shapefile_utils import SQ_METERS_PER_ACRE
+
+
+def _stacked_parcels(seed):
+    """
+    A grid with four more parcels stacked over its corner, so some land
+    is under five parcels
+    """
+    parcels = synthetic.parcel_grid(36, seed=seed)
+    x, y = synthetic.ORIGIN
+
+    extra = parcels.iloc[:4].copy()
+    extra["LOC_ID"] = [f"M_extra_{k}" for k in range(4)]
+    extra["geometry"] = [
+        shapely.box(x + 5 * k, y + 5 * k, x + 70 + 10 * k, y + 60 + 5 * k)
+        for k in range(4)
+    ]
+    return pd.concat([parcels, extra], ignore_index=True)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_overlap_correction_matches_dissolve(community, seed):
+    path, parcels = community(parcels_gdf=_stacked_parcels(seed))
+    session = CommunitySession(path, overlap_correction=True)
+
+    rng = np.random.default_rng(seed)
+    zone_ids = pd.Series(
+        rng.integers(1, 3, len(parcels)), index=session.land_map_gdf.index
+    )
+    # the stacked parcels and the corner under them in one district
+    zone_ids.iloc[[0, 1, 6, 7, -4, -3, -2, -1]] = 1
+
+    dissolved = session.land_map_gdf.geometry.groupby(zone_ids).apply(
+        lambda geometry: shapely.area(shapely.union_all(geometry.values))
+    )
+
+    np.testing.assert_allclose(
+        session.district_areas(zone_ids).to_numpy(),
+        dissolved.to_numpy() / SQ_METERS_PER_ACRE,
+        rtol=1e-9,
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import district_funcs
+from src.shapefile_processor import CommunitySession
+from utils import compliance_utils, district_kernel
+from test_model_pins import PINS
+
+# from pandas, about `compliance_utils.apply_district_funcs`
+pytestmark = pytest.mark.filterwarnings("ignore::FutureWarning")
+
+ENGINES = [
+    pytest.param(
+        engine,
+        marks=pytest.mark.skipif(
+            engine == "numba" and district_kernel._numba() is None,
+            reason="numba isn't installed",
+        ),
+    )
+    for engine in district_kernel.ENGINES
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_matches_apply_district_funcs(engine):
+    # raises if any column isn't exactly the same
+    district_funcs.check(40, seed=0, engines=[engine])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("with_o", [False, True])
+def test_no_limit_and_missing_areas(engine, with_o):
+    rng = np.random.default_rng(1)
+    params = dict(
+        district_funcs._random_parameters(rng),
+        additional_lot_SF="",
+        min_lot_size=5000,
+    )
+    parcels = district_funcs._random_parcels(rng, 2000, 5000, with_o=with_o)
+    parcels.loc[::7, "I"] = np.nan
+    parcels.loc[::11, "L"] = np.nan
+
+    expected = parcels.copy()
+    compliance_utils.apply_district_funcs(expected, **params)
+    got = parcels.copy()
+    district_kernel.apply_district_funcs(got, engine=engine, **params)
+
+    assert np.isinf(expected["AE"]).any()
+    assert district_funcs._differences(expected, got) == []
+
+
+def test_cache_can_use_the_reference(community):
+    path, _ = community(n_parcels=200)
+    session = CommunitySession(path)
+    reference = compliance_utils.DistrictFuncCache(
+        session.parcels_df, engine="reference"
+    )
+
+    for i in range(1, 6):
+        params = compliance_utils.district_parameters(
+            PINS["parameters"]["strict"], i, "N"
+        )
+        np.testing.assert_array_equal(
+            reference.contributions(**params),
+            session.district_func_cache.contributions(**params),
+        )
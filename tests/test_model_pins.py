@@ -0,0 +1,44 @@
+"""
+Checks the compliance model against what it gave before it kept its
+numbers in NumPy arrays, pinned in `data/model_pins.json`: the `Summary`
+sheet and `is_good_zoning` of a few zonings of made up communities, for
+a community with and without commuter rail (`I9`), and with the default
+and with stricter parameters
+"""
+
+import os
+import json
+import pytest
+
+import synthetic
+import interface
+from src.shapefile_processor import CommunitySession
+
+with open(os.path.join(os.path.dirname(__file__), "data", "model_pins.json")) as f:
+    PINS = json.load(f)
+
+GROUPS = sorted({(c["city"], c["seed"], c["parameters"]) for c in PINS["cases"]})
+
+
+@pytest.mark.parametrize("city,seed,parameters", GROUPS)
+def test_model_matches_pins(community, monkeypatch, city, seed, parameters):
+    monkeypatch.setitem(
+        interface.INITIALIZATIONS,
+        interface.CHECKLIST_PARAMETERS,
+        PINS["parameters"][parameters],
+    )
+    path, parcels = community(n_parcels=300, n_stations=2, seed=seed)
+    session = CommunitySession(path)
+    zonings = synthetic.band_zonings(parcels, 3, 3, seed=seed)
+
+    cases = [
+        c
+        for c in PINS["cases"]
+        if (c["city"], c["seed"], c["parameters"]) == (city, seed, parameters)
+    ]
+    for case in cases:
+        model = interface.analyze_zoning(
+            city, path, case["plan"], zonings[case["plan"]], session, output=None
+        )
+        assert model.is_good_zoning() == case["is_good_zoning"]
+        assert model["Summary"] == pytest.approx(case["summary"], rel=1e-9, nan_ok=True)
@@ -0,0 +1,53 @@
+import warnings
+import numpy as np
+import pytest
+
+import synthetic
+import interface
+from src.shapefile_processor import CommunitySession
+from test_model_pins import PINS
+
+
+def _analyze(city, path, zoning, session):
+    return interface.analyze_zoning(city, path, 0, zoning, session, output=None)
+
+
+@pytest.mark.parametrize("city,seed", [("Cambridge", 0), ("Arlington", 1)])
+# different parameters for each district, so moves change the sums, and
+# the default ones, where some of the sums are infinite
+@pytest.mark.parametrize("parameters", ["strict", "default"])
+def test_moves_match_a_fresh_analysis(community, monkeypatch, city, seed, parameters):
+    monkeypatch.setitem(
+        interface.INITIALIZATIONS,
+        interface.CHECKLIST_PARAMETERS,
+        PINS["parameters"][parameters],
+    )
+    path, parcels = community(n_parcels=200, n_stations=2, seed=seed)
+    session = CommunitySession(path)
+    zoning = synthetic.band_zonings(parcels, 3, 1, seed=seed)[0]
+    model = _analyze(city, path, zoning, session)
+
+    rng = np.random.default_rng(seed)
+    for _ in range(20):
+        plan = model._parcel_district
+        from_district, to_district = rng.choice([1, 2, 3], 2, replace=False)
+        in_district = np.flatnonzero(plan == from_district)
+        if not len(in_district):
+            continue
+        if from_district == 3 and rng.random() < 0.3:
+            # only the last district can be emptied, see `move_parcels`
+            parcel_ids = in_district
+        else:
+            parcel_ids = rng.choice(
+                in_district, rng.integers(0, len(in_district)), replace=False
+            )
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            is_good = model.move_parcels(parcel_ids, from_district, to_district)
+        fresh = _analyze(city, path, model._parcel_district.copy(), session)
+
+        assert is_good == fresh.is_good_zoning()
+        assert model["Summary"] == pytest.approx(
+            fresh["Summary"], rel=1e-9, abs=1e-6, nan_ok=True
+        )
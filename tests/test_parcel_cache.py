@@ -0,0 +1,38 @@
+import os
+import numpy as np
+
+from src.shapefile_processor import (
+    CommunitySession,
+    CommunityAttributes,
+    column_name_mapper,
+    CACHE_DTYPES,
+)
+from utils import parcel_cache
+
+
+def test_key_has_the_columns_and_dtypes(community):
+    path, _ = community(n_parcels=50)
+
+    paths = {
+        parcel_cache.cache_path(path, ["LOC_ID", "ACRES"]),
+        parcel_cache.cache_path(path, ["LOC_ID", "ACRES", "SQFT"]),
+        parcel_cache.cache_path(path, ["LOC_ID", "ACRES"], {"ACRES": np.float32}),
+        parcel_cache.cache_path(path, ["LOC_ID", "ACRES"], {"ACRES": np.float64}),
+    }
+    assert len(paths) == 4
+    assert parcel_cache.cache_path(path, ["ACRES", "LOC_ID"]) in paths
+
+
+def test_cached_parcels_match_the_shapefile(community):
+    path, _ = community(n_parcels=200)
+    session = CommunitySession(path)
+    cached = CommunitySession(path, use_parcel_cache=True)
+    attributes = CommunityAttributes(path)
+
+    assert os.path.exists(
+        parcel_cache.cache_path(path, column_name_mapper, CACHE_DTYPES)
+    )
+    for other in (cached, attributes):
+        assert other.parcels_df.equals(session.parcels_df)
+        assert other.parcel_area.equals(session.parcel_area)
+        assert other.parcel_stn_area.equals(session.parcel_stn_area)
@@ -0,0 +1,35 @@
+import synthetic
+import interface
+from src.shapefile_processor import CommunitySession
+from utils import profile_utils
+
+
+def test_workers_send_back_their_stages(community):
+    path, parcels = community(n_parcels=100, seed=0)
+    session = CommunitySession(path)
+    zonings = synthetic.band_zonings(parcels, 3, 6, seed=0)
+
+    with profile_utils.profiling() as profiler:
+        results = list(
+            interface.iter_analyze(
+                "Cambridge", path, zonings, workers=2, session=session, output=None
+            )
+        )
+
+    plans = sorted(
+        record["args"]["plan"]
+        for record in profiler.records
+        if record.get("stage") == "analyze_zoning"
+    )
+    assert len(results) == len(zonings)
+    assert plans == list(range(len(zonings)))
+    assert profiler.summary()["fill_model"]["count"] == len(zonings)
+
+
+def test_log_copies_its_fields():
+    cell_map = {"C43": "N"}
+    with profile_utils.profiling() as profiler:
+        profile_utils.log("filled", cell_map=cell_map)
+    cell_map["C43"] = "Y"
+
+    assert profiler.records[0]["args"]["cell_map"] == {"C43": "N"}
@@ -0,0 +1,38 @@
+import numpy as np
+
+import synthetic
+import interface
+from src.shapefile_processor import CommunitySession
+from utils.result_store import ResultStore
+from test_model_pins import PINS
+
+
+def test_results_are_kept_per_parameters(community, monkeypatch, tmp_path):
+    path, parcels = community(n_parcels=100, seed=0)
+    session = CommunitySession(path)
+    zonings = np.array(synthetic.band_zonings(parcels, 3, 3, seed=0))
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+
+    def _run(parameters):
+        monkeypatch.setitem(
+            interface.INITIALIZATIONS,
+            interface.CHECKLIST_PARAMETERS,
+            PINS["parameters"][parameters],
+        )
+        return [
+            summary["H21"]
+            for _, _, summary, _ in interface.iter_analyze(
+                "Cambridge", path, zonings, session=session, store=store, output=None
+            )
+        ]
+
+    default_units = _run("default")
+    assert len(store) == len(zonings)
+
+    # not the results saved with the other parameters
+    strict_units = _run("strict")
+    assert len(store) == 2 * len(zonings)
+    assert strict_units != default_units
+
+    assert _run("default") == default_units
+    assert len(store) == 2 * len(zonings)
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pytest
+
+import synthetic
+import interface
+from src.shapefile_processor import CommunitySession
+from utils.zoning_store import ZoningStore, ZONINGS_FILE
+
+
+def test_append_after_a_partial_write(tmp_path):
+    path = str(tmp_path / ZONINGS_FILE)
+    zonings = np.random.default_rng(0).integers(1, 4, (3, 10), dtype=np.uint8)
+
+    store = ZoningStore.create(path, 10)
+    store.extend(zonings[:2])
+    # like an append that stopped after writing some of its row
+    with open(path, "ab") as f:
+        f.write(b"\x07" * 6)
+
+    store = ZoningStore(path)
+    assert len(store) == 2
+    store.append(zonings[2])
+
+    store = ZoningStore(path)
+    np.testing.assert_array_equal(np.asarray(store), zonings)
+    assert os.path.getsize(path) == store.plans().offset + zonings.size
+
+
+def test_use_cache_checks_the_shapefile(community, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path, parcels = community(n_parcels=100, seed=0)
+    session = CommunitySession(path)
+    zonings = synthetic.band_zonings(parcels, 3, 2, seed=0)
+    work_dir = str(tmp_path / "work")
+    store_file = os.path.join(work_dir, ZONINGS_FILE)
+
+    def _run():
+        return interface.zone_and_analyze(
+            "Cambridge", path, use_cache=True, output=None, work_dir=work_dir
+        )
+
+    ZoningStore.create(store_file, len(parcels), shapefile_hash=session.shapefile_hash)
+    ZoningStore(store_file).extend(zonings)
+    analyzed, results = _run()
+    assert analyzed == [zoning.tolist() for zoning in zonings]
+
+    ZoningStore.create(store_file, len(parcels), shapefile_hash="another")
+    with pytest.raises(Exception, match="another shapefile"):
+        _run()
+
+    ZoningStore.create(store_file, 10, shapefile_hash=session.shapefile_hash)
+    with pytest.raises(Exception, match="10 parcels"):
+        _run()
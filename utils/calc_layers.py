@@ -1,15 +1,67 @@
 """
-Provides the 'Key Calculation Layers' from 
+Provides the 'Key Calculation Layers' from
 https://www.mass.gov/info-details/mbta-communities-compliance-model-components
 
 These are used in the pre-processing for the compliance model
+
+The layers cover the whole state, so they are only read when asked for,
+and only around the community being processed (see `half_mile_gdf`)
 """
 
+import os
+import shapely
 import geopandas as gpd
 import utils.shapefile_utils
+from utils import hash_utils, io_utils
 
-_gdf = gpd.read_file("./resources/half_mile.zip")
-HALF_MILE_GDF = utils.shapefile_utils.area_projection(_gdf)
+HALF_MILE_PATH = "./resources/half_mile.zip"
+CACHE_DIR = "cache"
 
 # TODO: figure why python can't load this one...
 GDDD_GDF = None
+
+_loaded = {}
+
+
+def half_mile_gdf(bbox=None, cache=True):
+    """
+    Returns the half-mile station areas, in the NAD83 MA projection
+
+    If `bbox` is given as `(xmin, ymin, xmax, ymax)` in the NAD83 MA
+    projection, only the station areas that reach it are read from the
+    file, and they are clipped to it. With `cache`, that result is also
+    saved in `CACHE_DIR` (keyed by the file's contents and `bbox`), so
+    the next run for the same community just loads it
+    """
+    if bbox is None:
+        if "full" not in _loaded:
+            _loaded["full"] = utils.shapefile_utils.area_projection(
+                gpd.read_file(HALF_MILE_PATH)
+            )
+        return _loaded["full"]
+
+    bbox = tuple(float(x) for x in bbox)
+    key = hash_utils.value_hash(hash_utils.file_hash(HALF_MILE_PATH), bbox)
+    path = os.path.join(CACHE_DIR, f"half_mile_{key[:16]}.gpkg")
+    if cache and os.path.exists(path):
+        return gpd.read_file(path)
+
+    box = gpd.GeoSeries([shapely.box(*bbox)], crs="EPSG:26986")
+    gdf = gpd.read_file(HALF_MILE_PATH, bbox=box)
+    gdf = utils.shapefile_utils.area_projection(gdf.to_crs(epsg=26986).clip(box))
+
+    if cache:
+        with io_utils.atomic_write(path) as temp_path:
+            gdf.to_file(temp_path, driver="GPKG")
+
+    return gdf
+
+
+def __getattr__(name):
+    """
+    Still lets `HALF_MILE_GDF` be used for the whole state's layer,
+    but only reads it the first time it's used
+    """
+    if name == "HALF_MILE_GDF":
+        return half_mile_gdf()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
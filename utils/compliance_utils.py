@@ -3,8 +3,10 @@ Provides utils that the compliance model needs
 (mainly the functions used in each of the district pages)
 """
 
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
+from utils import profile_utils, district_kernel
 
 _community_info_df = pd.DataFrame(pd.read_csv("./resources/community_info.csv"))
 
@@ -24,6 +26,7 @@ def get_community_info(community_name):
     return cell_map
 
 
+@profile_utils.profiled("apply_district_funcs")
 def apply_district_funcs(
     df,
     min_lot_size,
@@ -178,20 +181,19 @@ def apply_district_funcs(
     apply_AC_func()
 
     def apply_AD_func():
-        df["AD"] = np.where((df["I"] > 0) & (df["I"] < min_lot_size), "Y", "")
+        df["AD"] = pd.Categorical(
+            np.where((df["I"] > 0) & (df["I"] < min_lot_size), "Y", ""),
+            categories=["", "Y"],
+        )
 
     apply_AD_func()
 
     def apply_AE_func():
-        df["AE"] = np.where(
-            df["AD"] == "Y",
-            0,
-            np.where(
-                additional_lot_SF == "",
-                float("inf"),  # Python equivalent for "<no limit>"
-                np.floor(((df["I"] - base_min_lot_size) / additional_lot_SF) + 1),
-            ),
-        )
+        if additional_lot_SF == "":
+            ae = float("inf")  # Python equivalent for "<no limit>"
+        else:
+            ae = np.floor(((df["I"] - base_min_lot_size) / additional_lot_SF) + 1)
+        df["AE"] = np.where(df["AD"] == "Y", 0, ae)
 
     apply_AE_func()
 
@@ -208,3 +210,229 @@ def apply_district_funcs(
         df["AG"] = (43560 / df["I"]) * df["AF"]
 
     apply_AG_func()
+
+
+# per-district sums that the `District {i}` sheets report, in the order
+# that `parcel_contributions` returns them in
+DISTRICT_SUMS = [
+    "B10",
+    "B11",
+    "B12",
+    "B13",
+    "F9",
+    "F10",
+    "F11",
+    "F12",
+    "F13",
+    "X_sum",
+    "Y_sum",
+    "Z_sum",
+    "AA_sum",
+    "AB_sum",
+    "AC_sum",
+    "AE_sum",
+    "AF_sum",
+]
+
+
+# the columns that `apply_district_funcs` adds to a `District {i}` sheet
+DISTRICT_FUNC_COLUMNS = [
+    "O",
+    "N",
+    "Q",
+    "R",
+    "S",
+    "T",
+    "U",
+    "V",
+    "W",
+    "X",
+    "Y",
+    "Z",
+    "AA",
+    "AB",
+    "AC",
+    "AD",
+    "AE",
+    "AF",
+    "AG",
+]
+
+
+# columns of `DISTRICT_FUNC_COLUMNS` that only go into other columns, and
+# never into `parcel_contributions`. They're kept as float32 in the cache
+_INTERMEDIATE_COLUMNS = ["O", "N", "Q", "R", "S", "V", "AG"]
+
+
+# what `DistrictFuncCache` works out the tables with by default: None for
+# the fastest `district_kernel` engine, one of `district_kernel.ENGINES`,
+# or `"reference"` for `apply_district_funcs`
+DISTRICT_FUNCS_ENGINE = None
+
+
+class DistrictFuncCache:
+    """
+    Every column `apply_district_funcs` adds only depends on the parcel
+    and on the district's parameters, not on which other parcels are in
+    the district. So for a community, this runs `apply_district_funcs`
+    on all of its parcels once per set of parameters, and then the
+    `District {i}` sheets of each zoning just copy their parcels' rows
+
+    `parcels_df` has the `District {i}` sheet columns for every parcel of
+    the community, in the same order as in the shapefile
+
+    The columns that are only steps on the way to the others are kept
+    as float32, since nothing gets summed from them
+
+    The tables are worked out with `district_kernel`, which gives the
+    same numbers in one pass over the parcels. `engine` is passed on to
+    it, unless it's `"reference"`, which uses `apply_district_funcs`
+    instead. By default it's `DISTRICT_FUNCS_ENGINE`
+
+    Only the `max_tables` sets of parameters used last are kept (each is
+    a copy of `parcels_df`), so that sweeping over many of them doesn't
+    run out of memory
+    """
+
+    def __init__(self, parcels_df, max_tables=32, engine=None):
+        self._parcels_df = parcels_df
+        self._max_tables = max_tables
+        self._engine = DISTRICT_FUNCS_ENGINE if engine is None else engine
+        self._tables = OrderedDict()
+        self._contributions = OrderedDict()
+
+    def _kept(self, cache, key, make):
+        """
+        Returns `cache[key]`, made with `make()` if it isn't there, and
+        drops whatever was used least recently past `max_tables`
+        """
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        cache[key] = make()
+        while len(cache) > self._max_tables:
+            cache.popitem(last=False)
+        return cache[key]
+
+    def table(self, **params):
+        """
+        Returns `parcels_df` after `apply_district_funcs(**params)`.
+        Only computed the first time these `params` are seen (unless they
+        were dropped since)
+        """
+
+        def _make():
+            df = self._parcels_df.copy()
+            if self._engine == "reference":
+                apply_district_funcs(df, **params)
+            else:
+                district_kernel.apply_district_funcs(df, engine=self._engine, **params)
+            for col in _INTERMEDIATE_COLUMNS:
+                # `O` is all `pd.NA` when not given, which has to be made
+                # a NaN first
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+            return df
+
+        return self._kept(self._tables, tuple(sorted(params.items())), _make)
+
+    def contributions(self, **params):
+        """
+        Returns `parcel_contributions` of `table(**params)`
+        """
+        return self._kept(
+            self._contributions,
+            tuple(sorted(params.items())),
+            lambda: parcel_contributions(self.table(**params)),
+        )
+
+    def apply_district_funcs(self, df, **params):
+        """
+        Same as `apply_district_funcs`, but copies the results out of the
+        cache. Column `A` of `df` has to be each parcel's row in the
+        shapefile, which is only the case for the sheets `process_shapefile`
+        makes with `sheet_mode="join"` (marked in `df.attrs`)
+
+        For any other `df` (like from `"overlay"`, where `A` is the row of
+        the overlay), or if `df` has its own `O` column, the cached rows
+        don't apply, so this just calls `apply_district_funcs`
+        """
+        if "O" in df.columns or df.attrs.get("sheet_mode") != "join":
+            apply_district_funcs(df, **params)
+            return
+
+        rows = self.table(**params).iloc[df["A"].to_numpy(dtype=int)]
+        for col in DISTRICT_FUNC_COLUMNS:
+            # `.values` so that `AD` stays categorical
+            df[col] = rows[col].values
+
+
+def district_parameters(parameter_cells, i, water_included):
+    """
+    Given the `Checklist Parameters` cells in `parameter_cells`, returns
+    the keyword arguments that `apply_district_funcs` needs for district
+    `i` (1 to 5). Like `ComplianceModel`, cells of districts after the
+    first that aren't given are 0
+    """
+    col = {1: "E", 2: "H", 3: "K", 4: "N", 5: "Q"}[i]
+
+    def cell(row):
+        if i == 1:
+            return parameter_cells[f"{col}{row}"]
+        return parameter_cells.get(f"{col}{row}", 0)
+
+    return {
+        "water_included": water_included,
+        "max_units_per_lot": cell(16),
+        "min_lot_size": cell(22),
+        "base_min_lot_size": cell(24),
+        "additional_lot_SF": cell(25),
+        "building_height": cell(35),
+        "FAR": cell(43),
+        "max_lot_coverage": cell(58),
+        "min_required_open_space": cell(60),
+        "parking_spaces_per_unit": cell(86),
+        "lot_area_per_dwelling_unit": cell(101),
+        "max_dwelling_units_per_acre": cell(102),
+    }
+
+
+def parcel_contributions(df):
+    """
+    Given `df` that has been through `apply_district_funcs`, returns an
+    array with one row per parcel and one column per entry of
+    `DISTRICT_SUMS`, holding what that parcel adds to each of the sums
+
+    Summing the rows of the parcels in a district gives the same
+    numbers as the `District {i}` sheet
+    """
+    af = df["AF"].to_numpy(dtype=float)
+    u = df["U"].to_numpy(dtype=float)
+
+    columns = [
+        np.ones(len(df)),
+        df["H"].to_numpy(dtype=float),
+        df["W"].to_numpy(dtype=float),
+        af,
+        (df["AD"] == "Y").to_numpy(dtype=float),
+        np.where(df["G"] == "Y", af, 0),
+        df["L"].to_numpy(dtype=float),
+        df["T"].to_numpy(dtype=float),
+        np.where(u > 0, u, 0),
+    ] + [
+        df[col].to_numpy(dtype=float)
+        for col in ["X", "Y", "Z", "AA", "AB", "AC", "AE", "AF"]
+    ]
+
+    return np.column_stack(columns) if len(df) else np.zeros((0, len(DISTRICT_SUMS)))
+
+
+def district_sums(df):
+    """
+    Given the `District {i}` sheet `df` after `apply_district_funcs`,
+    returns its `DISTRICT_SUMS` (in that order), in one reduction over
+    its `parcel_contributions` instead of one pass per sum
+
+    To get the sums of all the districts of a zoning at once from its
+    labels, see `batch_model.segmented_sums`
+    """
+    return parcel_contributions(df).sum(axis=0)
@@ -0,0 +1,365 @@
+"""
+Provides a fused `compliance_utils.apply_district_funcs`, which works
+out every column of a parcel at once, instead of one column at a time
+for all the parcels (with a new array for each step)
+
+Uses `numba` if it's installed. Otherwise the parcels go through NumPy
+in chunks small enough that the steps stay in the CPU's cache
+
+Gives the same numbers as `compliance_utils.apply_district_funcs`
+(see `benchmarks/district_funcs.py`), as floats instead of objects
+"""
+
+import numpy as np
+import pandas as pd
+from utils import profile_utils
+
+# the columns worked out here, in the order of the rows of `district_funcs`.
+# `O` and `AD` aren't numbers, so they are handled by `apply_district_funcs`
+COLUMNS = [
+    "N",
+    "Q",
+    "R",
+    "S",
+    "T",
+    "U",
+    "V",
+    "W",
+    "X",
+    "Y",
+    "Z",
+    "AA",
+    "AB",
+    "AC",
+    "AE",
+    "AF",
+    "AG",
+]
+
+# parcels per chunk on the NumPy path
+CHUNK_SIZE = 8192
+
+ENGINES = ["numba", "numpy"]
+
+# the compiled kernel, once `numba` has been imported (False if it can't be)
+_numba_kernel = None
+
+
+def _parking_factor(parking_spaces_per_unit):
+    # same steps as `_parking_factor` in `apply_district_funcs`
+    if parking_spaces_per_unit == 0:
+        return 0.0
+    if 0.01 <= parking_spaces_per_unit <= 0.5:
+        return 0.3
+    if 0.5 < parking_spaces_per_unit <= 1:
+        return 0.45
+    if 1 < parking_spaces_per_unit <= 1.25:
+        return 0.55
+    if 1.25 < parking_spaces_per_unit <= 1.5:
+        return 0.6
+    return 0.65
+
+
+def _scalars(
+    min_lot_size,
+    min_required_open_space,
+    water_included,
+    parking_spaces_per_unit,
+    building_height,
+    max_dwelling_units_per_acre,
+    max_lot_coverage,
+    base_min_lot_size,
+    additional_lot_SF,
+    max_units_per_lot,
+    FAR,
+    lot_area_per_dwelling_unit,
+):
+    """
+    Turns the parameters of `apply_district_funcs` into the numbers the
+    kernels take. A limit that is 0 (or `""` for `additional_lot_SF`)
+    means there is none
+    """
+    has_additional_lot_SF = not (additional_lot_SF == "")
+    return (
+        float(min_lot_size),
+        max(0.2, min_required_open_space) if min_required_open_space < 1 else 0.2,
+        water_included == "Y",
+        _parking_factor(parking_spaces_per_unit),
+        float(building_height),
+        bool(max_dwelling_units_per_acre),
+        float(max_dwelling_units_per_acre),
+        bool(max_lot_coverage),
+        float(max_lot_coverage),
+        bool(lot_area_per_dwelling_unit),
+        float(lot_area_per_dwelling_unit),
+        bool(FAR),
+        float(FAR),
+        float(max_units_per_lot),
+        float(base_min_lot_size),
+        has_additional_lot_SF,
+        float(additional_lot_SF) if has_additional_lot_SF else 0.0,
+    )
+
+
+def _kernel(
+    I,
+    L,
+    O,
+    out,
+    ad,
+    min_lot,
+    S,
+    water,
+    parking_factor,
+    height,
+    has_max_du,
+    max_du,
+    has_max_lc,
+    max_lc,
+    has_lapdu,
+    lapdu,
+    has_far,
+    far,
+    max_units,
+    base_lot,
+    has_additional,
+    additional,
+):
+    # one parcel at a time. Compiled with `numba` (see `_numba`), so this
+    # has to stay plain loops and math. The order of the operations
+    # matches `apply_district_funcs`, so the floats come out the same
+    for k in range(I.shape[0]):
+        i = I[k]
+        o = O[k]
+        no_o = np.isnan(o)
+
+        n = i - L[k]
+        if i < min_lot or n < 0:
+            n = 0.0
+
+        q = n if no_o else o
+        r = L[k] / i
+
+        if not no_o:
+            t = q * S if o > 0 else 0.0
+        elif water:
+            # `np.maximum` gives NaN if `r` is
+            t = (r if r > S or np.isnan(r) else S) * i
+        else:
+            t = (r + S) * i
+
+        u = (i - t) * parking_factor if q > 0 else 0.0
+        v = i - t - u if not np.isnan(q) and q != 0 else 0.0
+        w = v * height if v > 0 else 0.0
+
+        # a `W` between 2500 and 3000 gives 3, which is 0 after `/ 1000`
+        x = np.floor(np.floor(w) / 1000) if w > 3000 else 0.0
+
+        y = (i / 43560) * max_du if has_max_du else np.nan
+        z = (i * max_lc * height) / 1000 if has_max_lc else np.inf
+        aa = i / lapdu if has_lapdu else np.nan
+        ab = (i * far) / 1000 if has_far else np.nan
+
+        if max_units >= 3 and max_units < x:
+            ac = np.floor(max_units)
+        elif max_units < x and max_units < 3:
+            ac = 0.0
+        else:
+            ac = np.floor(x)
+
+        is_ad = i > 0 and i < min_lot
+        if is_ad:
+            ae = 0.0
+        elif not has_additional:
+            ae = np.inf
+        else:
+            ae = np.floor(((i - base_lot) / additional) + 1)
+
+        # the smallest that isn't NaN
+        expr = np.inf
+        for value in (x, y, z, aa, ab, ac, ae):
+            if value < expr:
+                expr = value
+
+        if expr < 2.5:
+            af = 0.0
+        elif expr < 3:
+            af = 3.0
+        else:
+            af = np.rint(expr)
+
+        out[0, k] = n
+        out[1, k] = q
+        out[2, k] = r
+        out[3, k] = S
+        out[4, k] = t
+        out[5, k] = u
+        out[6, k] = v
+        out[7, k] = w
+        out[8, k] = x
+        out[9, k] = y
+        out[10, k] = z
+        out[11, k] = aa
+        out[12, k] = ab
+        out[13, k] = ac
+        out[14, k] = ae
+        out[15, k] = af
+        out[16, k] = (43560 / i) * af
+        ad[k] = is_ad
+
+
+def _numba():
+    """
+    Returns `_kernel` compiled by `numba`, or None if it isn't installed
+    """
+    global _numba_kernel
+    if _numba_kernel is None:
+        try:
+            import numba
+        except ImportError:
+            _numba_kernel = False
+        else:
+            # `error_model="numpy"` so that dividing by 0 gives inf/NaN
+            # like NumPy, instead of raising
+            _numba_kernel = numba.njit(cache=True, error_model="numpy")(_kernel)
+    return _numba_kernel or None
+
+
+def _chunk(I, L, O, out, ad, *scalars):
+    # `_kernel` for a whole chunk at once, with NumPy
+    (
+        min_lot,
+        S,
+        water,
+        parking_factor,
+        height,
+        has_max_du,
+        max_du,
+        has_max_lc,
+        max_lc,
+        has_lapdu,
+        lapdu,
+        has_far,
+        far,
+        max_units,
+        base_lot,
+        has_additional,
+        additional,
+    ) = scalars
+    no_o = np.isnan(O)
+
+    n = I - L
+    n[(I < min_lot) | (n < 0)] = 0
+    q = np.where(no_o, n, O)
+    r = L / I
+
+    t = np.where(
+        no_o,
+        (np.maximum(r, S) if water else r + S) * I,
+        np.where(O > 0, q * S, 0),
+    )
+    u = np.where(q > 0, (I - t) * parking_factor, 0)
+    v = np.where(~np.isnan(q) & (q != 0), I - t - u, 0)
+    w = np.where(v > 0, v * height, 0)
+    x = np.where(w > 3000, np.floor(np.floor(w) / 1000), 0)
+
+    y = (I / 43560) * max_du if has_max_du else np.full(len(I), np.nan)
+    z = (I * max_lc * height) / 1000 if has_max_lc else np.full(len(I), np.inf)
+    aa = I / lapdu if has_lapdu else np.full(len(I), np.nan)
+    ab = (I * far) / 1000 if has_far else np.full(len(I), np.nan)
+
+    ac = np.floor(
+        np.where(
+            (max_units >= 3) & (max_units < x),
+            max_units,
+            np.where((max_units < x) & (max_units < 3), 0, x),
+        )
+    )
+
+    ad[:] = (I > 0) & (I < min_lot)
+    ae = (
+        np.floor(((I - base_lot) / additional) + 1)
+        if has_additional
+        else np.full(len(I), np.inf)
+    )
+    ae[ad] = 0
+
+    expr = np.fmin.reduce([x, y, z, aa, ab, ac, ae])
+    expr[np.isnan(expr)] = np.inf
+    af = np.where(expr < 2.5, 0, np.where(expr < 3, 3, np.round(expr)))
+
+    for row, values in enumerate(
+        [n, q, r, S, t, u, v, w, x, y, z, aa, ab, ac, ae, af, (43560 / I) * af]
+    ):
+        out[row] = values
+
+
+def district_funcs(I, L, O=None, engine=None, **params):
+    """
+    Works out the `COLUMNS` of the `District {i}` sheets for parcels with
+    `I` (square feet), `L` (excluded square feet), and `O` (NaN where not
+    given), with the parameters of `apply_district_funcs`
+
+    Returns an array with one row per entry of `COLUMNS` and one column
+    per parcel, and whether each parcel is under the minimum lot size
+    (`AD`)
+
+    `engine` is `"numba"` or `"numpy"`. By default, `numba` is used if
+    it's installed
+    """
+    I = np.ascontiguousarray(I, dtype=np.float64)
+    L = np.ascontiguousarray(L, dtype=np.float64)
+    O = (
+        np.full(len(I), np.nan)
+        if O is None
+        else np.ascontiguousarray(O, dtype=np.float64)
+    )
+    scalars = _scalars(**params)
+
+    out = np.empty((len(COLUMNS), len(I)))
+    ad = np.empty(len(I), dtype=np.bool_)
+
+    if engine is None:
+        engine = "numba" if _numba() is not None else "numpy"
+    if engine not in ENGINES:
+        raise Exception(f"`engine` has to be one of {ENGINES}, not {engine}")
+
+    if engine == "numba":
+        kernel = _numba()
+        if kernel is None:
+            raise Exception("The numba engine needs `numba` installed")
+        kernel(I, L, O, out, ad, *scalars)
+    else:
+        with np.errstate(all="ignore"):
+            for start in range(0, len(I), CHUNK_SIZE):
+                chunk = slice(start, start + CHUNK_SIZE)
+                _chunk(I[chunk], L[chunk], O[chunk], out[:, chunk], ad[chunk], *scalars)
+
+    return out, ad
+
+
+@profile_utils.profiled("apply_district_funcs_fused")
+def apply_district_funcs(df, engine=None, **params):
+    """
+    Same as `compliance_utils.apply_district_funcs`, with `district_funcs`
+    """
+    if "O" not in df.columns:
+        df["O"] = pd.NA
+        O = None
+    else:
+        O = pd.to_numeric(df["O"], errors="coerce").to_numpy(dtype=np.float64)
+
+    out, ad = district_funcs(
+        df["I"].to_numpy(dtype=np.float64),
+        df["L"].to_numpy(dtype=np.float64),
+        O,
+        engine=engine,
+        **params,
+    )
+    for row, col in enumerate(COLUMNS):
+        if col == "AE":
+            # in the same place as `apply_district_funcs` puts it
+            df["AD"] = pd.Categorical.from_codes(
+                ad.astype(np.int8), categories=["", "Y"]
+            )
+        df[col] = out[row]
@@ -0,0 +1,40 @@
+"""
+Provides utils for hashing inputs, so that things computed from them
+can be cached and found again
+"""
+
+import json
+import hashlib
+import numpy as np
+from utils.result_utils import json_default
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of the contents of the file at `path`
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def value_hash(*values):
+    """
+    Returns the SHA-256 hex digest of `values`, which can be anything
+    `json` can write (NumPy numbers are written as plain numbers).
+    Dicts hash the same no matter what order their keys are in
+    """
+    text = json.dumps(values, sort_keys=True, default=json_default)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def zoning_hash(prefix, zoning):
+    """
+    Returns the SHA-256 hex digest of the string `prefix` followed by
+    the district labels in `zoning`
+    """
+    digest = hashlib.sha256(prefix.encode())
+    digest.update(np.ascontiguousarray(zoning, dtype=np.int64).tobytes())
+    return digest.hexdigest()
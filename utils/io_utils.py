@@ -0,0 +1,26 @@
+"""
+Provides utils for writing files
+"""
+
+import os
+import contextlib
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """
+    Gives a temporary path next to `path` (with the same extension) to
+    write to inside the `with`, which is then moved to `path` in one step
+
+    So a run that stops partway never leaves half a file at `path`. If
+    the code inside the `with` fails, the temporary file is removed
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    temp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
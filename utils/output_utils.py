@@ -0,0 +1,155 @@
+"""
+Provides the ways that the zoned shapefile of each zoning can be saved
+
+A writer is anything with a `write(name, gdf)` method (and a `close()`
+method, called once all the zonings are done)
+"""
+
+import os
+import queue
+import zipfile
+import tempfile
+import threading
+
+
+def save_zipped_shapefile(gdf, name):
+    """
+    Saves `gdf` as a shapefile zipped into `{name}.zip`
+    """
+    # Separate temporary directory, unique so that processes running
+    # at the same time don't write into each other's
+    temp_dir = tempfile.mkdtemp(prefix="temp_shapefiles_")
+
+    # Create shapefiles in temp_dir
+    output_shapefile = f"{temp_dir}/zoned.shp"
+    gdf.to_file(output_shapefile)
+
+    # Create ZIP in final output location (not in temp_dir)
+    zip_output_path = f"{name}.zip"  # Not inside temp_dir
+    with zipfile.ZipFile(zip_output_path, "w") as zipf:
+        for file in os.listdir(temp_dir):
+            zipf.write(os.path.join(temp_dir, file), arcname=file)
+
+    # Cleanup temp directory
+    for file in os.listdir(temp_dir):
+        os.remove(os.path.join(temp_dir, file))
+    os.rmdir(temp_dir)
+
+
+class ZipWriter:
+    """
+    Saves each zoning as its own zipped shapefile, `{name}.zip`
+    """
+
+    def write(self, name, gdf):
+        save_zipped_shapefile(gdf, name)
+
+    def close(self):
+        return
+
+
+class GeoPackageWriter:
+    """
+    Saves every zoning into one `layer` of the GeoPackage at `path`, with
+    a `plan_id` column holding the name of each zoning. Replaces the
+    layer if it already exists
+    """
+
+    def __init__(self, path, layer="zonings"):
+        self.path = path
+        self.layer = layer
+        self._started = False
+
+    def write(self, name, gdf):
+        gdf = gdf.copy()
+        gdf.insert(0, "plan_id", os.path.basename(name))
+        gdf.to_file(
+            self.path,
+            layer=self.layer,
+            driver="GPKG",
+            mode="a" if self._started else "w",
+        )
+        self._started = True
+
+    def close(self):
+        return
+
+
+class CollectingWriter:
+    """
+    Doesn't save anything, just keeps what it's given in `written` so
+    it can be handed to another writer (like from a worker process)
+    """
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, name, gdf):
+        self.written.append((name, gdf))
+
+    def close(self):
+        return
+
+
+class BackgroundWriter:
+    """
+    Passes everything to `writer` on a separate thread, so that saving
+    doesn't hold up the next zoning. At most `max_pending` zonings wait
+    to be saved before `write` blocks
+
+    `close` waits for everything to be saved. If `writer` fails, the
+    error is raised from the next `write` or from `close`
+    """
+
+    def __init__(self, writer, max_pending=8):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is None:
+                try:
+                    self.writer.write(*item)
+                except Exception as error:
+                    self._error = error
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, name, gdf):
+        self._raise_error()
+        self._queue.put((name, gdf))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.close()
+        self._raise_error()
+
+
+def make_writer(output, gpkg_path=None):
+    """
+    Returns the writer for the `output` mode
+        * `"zip"`: each zoning as its own zipped shapefile
+        * `"background"`: like `"zip"`, but on a separate thread
+        * `"gpkg"`: every zoning in one GeoPackage at `gpkg_path`,
+        written on a separate thread
+        * None: nothing is saved (returns None)
+    Anything else fails
+    """
+    if output is None:
+        return None
+    if output == "zip":
+        return ZipWriter()
+    if output == "background":
+        return BackgroundWriter(ZipWriter())
+    if output == "gpkg":
+        return BackgroundWriter(GeoPackageWriter(gpkg_path))
+    raise Exception(f"Unknown output mode `{output}`")
@@ -0,0 +1,111 @@
+"""
+Provides a columnar cache of a community's parcels, so that the zipped
+shapefile only has to be read (and projected, and overlaid with the
+station areas) once
+
+The cache is a GeoParquet file in `CACHE_DIR`, keyed by the contents of
+the shapefile and of the station areas, and by the columns (and their
+dtypes) that are asked for. It has the NAD83 MA geometry, those
+columns, and each parcel's `area` and
+`stn_area` in acres. The attributes can be read without the geometry,
+memory mapped and only the columns needed (see `read_attributes`)
+
+Needs `pyarrow`
+"""
+
+import os
+import pandas as pd
+import geopandas as gpd
+from utils import calc_layers, hash_utils, io_utils, shapefile_utils
+
+CACHE_DIR = "cache"
+GEOMETRY = "geometry"
+
+
+def _pyarrow_parquet():
+    # only needed for the cache, so everything else works without it
+    try:
+        import pyarrow.parquet
+    except ImportError as e:
+        raise Exception("The parcel cache needs `pyarrow` installed") from e
+    return pyarrow.parquet
+
+
+def cache_path(city_shp_file_path, columns, dtypes=None, cache_dir=None):
+    """
+    Returns where the cache of the shapefile at `city_shp_file_path`
+    with `columns` and `dtypes` (see `build`) is (or would be) saved, in
+    `cache_dir` (`CACHE_DIR` by default)
+    """
+    key = hash_utils.value_hash(
+        hash_utils.file_hash(city_shp_file_path),
+        hash_utils.file_hash(calc_layers.HALF_MILE_PATH),
+        sorted(columns),
+        {
+            col: str(pd.api.types.pandas_dtype(dtype))
+            for col, dtype in (dtypes or {}).items()
+        },
+    )
+    return os.path.join(
+        CACHE_DIR if cache_dir is None else cache_dir, f"parcels_{key[:16]}.parquet"
+    )
+
+
+def build(city_shp_file_path, columns, path, dtypes=None):
+    """
+    Reads the zipped shapefile at `city_shp_file_path` and saves its
+    parcels to `path`, with only the `columns` (that it has) and the
+    geometry, projected to NAD83 MA. `area` and `stn_area` are added
+
+    `dtypes` optionally maps some of the columns to the dtype to save
+    them as
+    """
+    _pyarrow_parquet()
+
+    gdf = gpd.read_file(city_shp_file_path)
+    gdf = gdf[[col for col in gdf.columns if col in columns] + [GEOMETRY]]
+    if dtypes:
+        gdf = gdf.astype({col: dtypes[col] for col in dtypes if col in gdf.columns})
+    gdf = shapefile_utils.area_projection(gdf, drop=False)
+    gdf["stn_area"] = shapefile_utils.parcel_station_area(
+        gdf, calc_layers.half_mile_gdf(bbox=gdf.total_bounds)
+    )
+
+    with io_utils.atomic_write(path) as temp_path:
+        gdf.to_parquet(temp_path)
+
+
+def cached(city_shp_file_path, columns, dtypes=None, cache_dir=None):
+    """
+    Returns the path of the cache of the shapefile at
+    `city_shp_file_path`, making it first (see `build`) if it isn't
+    there yet
+    """
+    path = cache_path(city_shp_file_path, columns, dtypes, cache_dir)
+    if not os.path.exists(path):
+        build(city_shp_file_path, columns, path, dtypes)
+    return path
+
+
+def read_parcels(path, columns=None):
+    """
+    Returns the parcels saved at `path` as a GeoDataFrame, with only
+    `columns` (and the geometry) if given
+    """
+    _pyarrow_parquet()
+    if columns is not None:
+        columns = [col for col in columns if col != GEOMETRY] + [GEOMETRY]
+    return gpd.read_parquet(path, columns=columns)
+
+
+def read_attributes(path, columns=None):
+    """
+    Returns the parcels saved at `path` as a DataFrame without the
+    geometry, which never gets decoded. Only `columns` are read if given.
+    The file is memory mapped instead of read into memory first
+    """
+    parquet = _pyarrow_parquet()
+    if columns is None:
+        columns = [col for col in parquet.read_schema(path).names if col != GEOMETRY]
+    table = parquet.read_table(path, columns=list(columns), memory_map=True)
+    return table.to_pandas()
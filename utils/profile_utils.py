@@ -0,0 +1,253 @@
+"""
+Provides opt-in timing and memory records of the stages of a run, to
+see where the time goes
+
+Nothing is recorded unless a `Profiler` is turned on (with `profiling`).
+While it's off, `stage` and `log` do next to nothing, so they can stay
+in the code
+"""
+
+import os
+import copy
+import json
+import time
+import threading
+import contextlib
+import functools
+from utils.result_utils import json_default
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+_NOT_PROFILING = contextlib.nullcontext()
+
+# the `Profiler` that is on, if any
+_active = None
+
+
+def _peak_rss_mb():
+    """
+    Returns the most memory this process has used so far, in MB (None
+    where that can't be told)
+    """
+    if resource is None:
+        return None
+    # in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Profiler:
+    """
+    Records how long each stage took (wall clock and CPU time), and the
+    peak memory of the process when it ended
+
+    Each record also gets the arguments of the stages it's inside of,
+    so the stages of one zoning can be told apart by their `plan`
+    """
+
+    def __init__(self):
+        self.records = []
+        self._start = time.perf_counter()
+        self._context = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._context, "stack"):
+            self._context.stack = [{}]
+        return self._context.stack
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        """
+        Records the code inside the `with` as stage `name`, with `args`
+        """
+        stack = self._stack()
+        args = stack[-1] | args
+        stack.append(args)
+
+        rss_before = _peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            cpu = time.process_time() - cpu_start
+            end = time.perf_counter()
+            rss = _peak_rss_mb()
+            stack.pop()
+
+            self.records.append(
+                {
+                    "stage": name,
+                    "args": args,
+                    "start": wall_start - self._start,
+                    "wall": end - wall_start,
+                    "cpu": cpu,
+                    "peak_rss_mb": rss,
+                    "peak_rss_increase_mb": (
+                        rss - rss_before if rss is not None else None
+                    ),
+                    "pid": os.getpid(),
+                    "thread": threading.get_ident(),
+                }
+            )
+
+    def log(self, name, **fields):
+        """
+        Records that `name` happened, with `fields`. Those are copied, so
+        changing them afterwards doesn't change the record
+        """
+        fields = {key: copy.copy(value) for key, value in fields.items()}
+        self.records.append(
+            {
+                "event": name,
+                "args": self._stack()[-1] | fields,
+                "start": time.perf_counter() - self._start,
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+            }
+        )
+
+    def summary(self):
+        """
+        Returns `{stage: totals}` over all the records of each stage:
+        how many there were, the wall and CPU time, and the peak memory
+        """
+        totals = {}
+        for record in self.records:
+            if "stage" not in record:
+                continue
+            total = totals.setdefault(
+                record["stage"], {"count": 0, "wall": 0, "cpu": 0, "peak_rss_mb": 0}
+            )
+            total["count"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], record["peak_rss_mb"] or 0)
+        return totals
+
+    def save_json(self, path):
+        """
+        Saves the records and their `summary` to `path` as JSON
+        """
+        with open(path, "w") as f:
+            json.dump(
+                {"summary": self.summary(), "records": self.records},
+                f,
+                indent=4,
+                default=json_default,
+            )
+
+    def chrome_trace(self):
+        """
+        Returns the records in the Chrome trace format, which
+        chrome://tracing and https://ui.perfetto.dev can open
+        """
+        events = []
+        for record in self.records:
+            event = {
+                "name": record.get("stage", record.get("event")),
+                "ts": record["start"] * 1e6,
+                "pid": record["pid"],
+                "tid": record["thread"],
+                "args": dict(record["args"]),
+            }
+            if "stage" in record:
+                event["ph"] = "X"
+                event["dur"] = record["wall"] * 1e6
+                event["args"].update(
+                    cpu=record["cpu"], peak_rss_mb=record["peak_rss_mb"]
+                )
+            else:
+                event["ph"] = "i"
+                event["s"] = "t"
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path):
+        """
+        Saves `chrome_trace` to `path`
+        """
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f, default=json_default)
+
+    def save(self, path):
+        """
+        Saves a Chrome trace if `path` ends with `.trace.json`, and the
+        JSON records otherwise
+        """
+        if path.endswith(".trace.json"):
+            self.save_chrome_trace(path)
+        else:
+            self.save_json(path)
+
+
+@contextlib.contextmanager
+def profiling(profiler=None):
+    """
+    Turns on `profiler` (a new `Profiler` by default) for the code
+    inside the `with`, and gives it back
+
+    Only the stages of this process are recorded. Worker processes have
+    to send theirs back to be added with `add_records` (like `iter_analyze`
+    does)
+    """
+    global _active
+    profiler = Profiler() if profiler is None else profiler
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+
+
+def active():
+    """
+    Returns the `Profiler` that is on, or None
+    """
+    return _active
+
+
+def add_records(records):
+    """
+    Adds `records` (like those of a worker process's copy of the profiler)
+    to the profiler that is on. Does nothing if none is
+    """
+    if _active is not None:
+        _active.records.extend(records)
+
+
+def stage(name, **args):
+    """
+    `Profiler.stage` of the profiler that is on. Does nothing if none is
+    """
+    if _active is None:
+        return _NOT_PROFILING
+    return _active.stage(name, **args)
+
+
+def log(name, **fields):
+    """
+    `Profiler.log` on the profiler that is on. Does nothing if none is
+    """
+    if _active is not None:
+        _active.log(name, **fields)
+
+
+def profiled(name):
+    """
+    Decorator that records every call of the function as stage `name`
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
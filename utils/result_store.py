@@ -0,0 +1,104 @@
+"""
+Provides a persistent store of zoning results, so that a zoning that
+was already analyzed with the same inputs doesn't get analyzed again
+(like when resuming a run that stopped partway)
+"""
+
+import json
+import time
+import sqlite3
+from utils import hash_utils
+from utils.result_utils import json_default
+
+
+class ResultStore:
+    """
+    Results of analyzing zonings, saved in the SQLite database at `path`.
+    Each result is keyed by a hash of everything that went into it (see
+    `run_key` and `zoning_key`)
+
+    Keeps at most `max_entries` results. When there are more, the ones
+    used least recently are thrown out
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.max_entries = max_entries
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                passed INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def run_key(shapefile_hash, parameter_cells, community_info, water_included):
+        """
+        Returns the part of the key that is the same for every zoning of a
+        run: the shapefile's contents (as a hash), the `Checklist
+        Parameters`, the community's row of `community_info.csv` and
+        whether water is included
+        """
+        return hash_utils.value_hash(
+            shapefile_hash, parameter_cells, community_info, water_included
+        )
+
+    @staticmethod
+    def zoning_key(run_key, zoning):
+        """
+        Returns the key for `zoning` in the run with key `run_key`
+        """
+        return hash_utils.zoning_hash(run_key, zoning)
+
+    def get(self, key):
+        """
+        Returns `(summary, passed)` saved for `key`, or None if there
+        isn't one
+        """
+        row = self._connection.execute(
+            "SELECT summary, passed FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        self._connection.execute(
+            "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+        )
+        self._connection.commit()
+        return json.loads(row[0]), bool(row[1])
+
+    def put(self, key, summary, passed):
+        """
+        Saves `summary` (the `Summary` sheet) and `passed` for `key`,
+        then throws out old results if there are too many
+        """
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (
+                key,
+                json.dumps(summary, default=json_default),
+                int(passed),
+                time.time(),
+            ),
+        )
+        self._connection.execute(
+            """
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,39 @@
+"""
+Provides utils for saving the results of analyzing zonings
+as they come in
+"""
+
+import json
+
+
+def json_default(value):
+    """
+    Lets `json` write NumPy numbers (and anything else as a string)
+    """
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def append_jsonl(path, record):
+    """
+    Appends `record` to the JSON lines file at `path` (one JSON object
+    per line), and flushes it so it's on disk right away
+    """
+    with open(path, "a") as f:
+        f.write(json.dumps(record, default=json_default) + "\n")
+        f.flush()
+
+
+def read_jsonl(path):
+    """
+    Yields each record of the JSON lines file at `path`. A last line
+    that was only partly written (like after a crash) is skipped
+    """
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
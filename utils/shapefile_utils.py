@@ -3,8 +3,13 @@ Provides utils for pre-processing information from shapefiles
 to use the compliance model
 """
 
+import numpy as np
+import pandas as pd
+import shapely
 import geopandas as gpd
 
+SQ_METERS_PER_ACRE = 4046.8564224
+
 
 def area_projection(gdf, drop=True):
     """
@@ -15,7 +20,7 @@ def area_projection(gdf, drop=True):
     """
 
     gdf = gdf.to_crs(epsg=26986)
-    gdf["area"] = gdf.geometry.area / 4046.8564224
+    gdf["area"] = gdf.geometry.area / SQ_METERS_PER_ACRE
     if drop:
         gdf = gdf[["geometry", "area"]]
 
@@ -30,18 +35,74 @@ def total_area(gdf, area_field="area"):
     return gdf[area_field].sum()
 
 
-def area_intersection(gdf1, gdf2):
+def parcel_station_area(parcels_gdf, station_gdf):
+    """
+    Given `parcels_gdf` and the station areas in `station_gdf`, returns
+    the acres of each parcel that are inside any station area (in the
+    NAD83 MA projection)
+
+    Only station areas that reach the community are looked at, and
+    they are clipped to the community's bounding box before being
+    merged, so this stays fast even with the whole state's stations
+    """
+    parcels = parcels_gdf.geometry.to_crs(epsg=26986).values
+    stations = station_gdf.geometry.to_crs(epsg=26986).values
+    bounds = shapely.total_bounds(parcels)
+
+    nearby = shapely.STRtree(stations).query(shapely.box(*bounds))
+    station_area = shapely.union_all(shapely.clip_by_rect(stations[nearby], *bounds))
+    shapely.prepare(station_area)
+
+    areas = np.zeros(len(parcels))
+    touching = shapely.STRtree(parcels).query(station_area, predicate="intersects")
+    areas[touching] = (
+        shapely.area(shapely.intersection(parcels[touching], station_area))
+        / SQ_METERS_PER_ACRE
+    )
+
+    return areas
+
+
+def parcel_overlaps(gdf):
+    """
+    Given the parcels in `gdf`, returns `(left, right, acres)`: for each
+    pair of parcels `left[k] < right[k]` that overlap, the acres they
+    share (in the NAD83 MA projection)
+
+    Parcels that only touch along an edge or at a corner are left out
+    """
+    parcels = gdf.geometry.to_crs(epsg=26986).values
+    left, right = shapely.STRtree(parcels).query(parcels, predicate="intersects")
+    keep = left < right
+    left, right = left[keep], right[keep]
+
+    acres = (
+        shapely.area(shapely.intersection(parcels[left], parcels[right]))
+        / SQ_METERS_PER_ACRE
+    )
+    overlapping = acres > 0
+
+    return left[overlapping], right[overlapping], acres[overlapping]
+
+
+def overlap_acres(gdf, groups):
     """
-    Given `gdf1` and `gdf2`, returns the NAD83 projection of where the two
-    intersect, based on `gdf1`. The new station area is recorded into
-    `stn_area`
+    Given the parcels in `gdf` and the group of each in `groups`, returns
+    a Series with the acres of each group that adding up its parcels'
+    areas counts more than once: the sum of their areas less the area
+    of their union (in the NAD83 MA projection)
     """
-    intersection = gpd.overlay(gdf1, gdf2, how="intersection")
-    intersection["intersection_area"] = intersection.geometry.area
+    parcels = gdf.geometry.to_crs(epsg=26986).values
+    groups = np.asarray(groups)
 
-    gdf1[["stn_area"]] = area_projection(intersection)[["area"]]
+    extra = {}
+    for group in np.unique(groups):
+        members = parcels[groups == group]
+        extra[group] = (
+            shapely.area(members).sum() - shapely.area(shapely.union_all(members))
+        ) / SQ_METERS_PER_ACRE
 
-    return gdf1
+    return pd.Series(extra, dtype=float)
 
 
 def gross_ddd_thing(gdf):
@@ -0,0 +1,158 @@
+"""
+Provides a binary store of a community's zonings, so that they can be
+saved as they're made and loaded again without parsing them
+
+The zonings are one `.npy` file holding a (n_plans x n_parcels) uint8
+array (the district of each parcel, one row per zoning), which is read
+memory mapped, so a zoning is only read from disk when it's used.
+What they were made from (the shapefile's hash, the number of
+districts and the seed) is saved next to it, in `{path}.json`
+"""
+
+import io
+import os
+import json
+import numpy as np
+
+ZONINGS_FILE = "zonings.npy"
+DTYPE = np.uint8
+
+
+def _metadata_path(path):
+    return f"{path}.json"
+
+
+class ZoningStore:
+    """
+    The zonings saved at `path` (see `create` to make a new one)
+
+    Works like a read-only list of zonings, where each zoning is a row
+    of the memory mapped array (so not a copy). `append` and `extend`
+    add zonings at the end of the file, without rewriting what's there
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(_metadata_path(path), "r") as f:
+            self.metadata = json.load(f)
+        self._plans = None
+
+    @classmethod
+    def create(cls, path, n_parcels, shapefile_hash=None, n_districts=None, seed=None):
+        """
+        Makes an empty store at `path` (replacing any that was there) for
+        zonings of `n_parcels` parcels, and returns it
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            np.lib.format.write_array_header_1_0(f, cls._header((0, n_parcels)))
+        with open(_metadata_path(path), "w") as f:
+            json.dump(
+                {
+                    "shapefile_hash": shapefile_hash,
+                    "n_districts": n_districts,
+                    "seed": seed,
+                },
+                f,
+                indent=4,
+            )
+        return cls(path)
+
+    @staticmethod
+    def _header(shape):
+        return {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(DTYPE)),
+            "fortran_order": False,
+            "shape": shape,
+        }
+
+    def plans(self):
+        """
+        Returns every zoning as a read-only (n_plans x n_parcels) array,
+        memory mapped from the file
+        """
+        if self._plans is None:
+            self._plans = np.load(self.path, mmap_mode="r")
+        return self._plans
+
+    @property
+    def n_parcels(self):
+        return self.plans().shape[1]
+
+    def __len__(self):
+        return self.plans().shape[0]
+
+    def __getitem__(self, idx):
+        return self.plans()[idx]
+
+    def __iter__(self):
+        return iter(self.plans())
+
+    def __array__(self, dtype=None, copy=None):
+        # so `np.asarray` gives `plans()` without copying it
+        return np.asarray(self.plans(), dtype=dtype)
+
+    def extend(self, zonings):
+        """
+        Adds `zonings` (each with the district of every parcel, from 0 to
+        255) at the end
+        """
+        zonings = np.asarray(zonings)
+        if zonings.ndim != 2 or zonings.shape[1] != self.n_parcels:
+            raise Exception(
+                f"Zonings have to be {self.n_parcels} parcels each, "
+                f"not shape {zonings.shape}"
+            )
+        if zonings.size and (zonings.min() < 0 or zonings.max() > 255):
+            raise Exception("Districts have to be from 0 to 255")
+
+        # `.npy` headers are padded so that the number of rows can grow
+        # without the header getting longer
+        n_plans, n_parcels = len(self), self.n_parcels
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header, self._header((n_plans + len(zonings), n_parcels))
+        )
+        self._plans = None
+
+        with open(self.path, "r+b") as f:
+            np.lib.format.read_magic(f)
+            np.lib.format.read_array_header_1_0(f)
+            if f.tell() != len(header.getvalue()):
+                raise Exception(f"The header of {self.path} can't grow in place")
+
+            # the rows go in before the header says they're there, so if
+            # this stops partway the file still reads as it was. Whatever
+            # such an append left past the rows the header counts goes
+            f.seek(f.tell() + n_plans * n_parcels * np.dtype(DTYPE).itemsize)
+            f.truncate()
+            f.write(np.ascontiguousarray(zonings, dtype=DTYPE).tobytes())
+            f.seek(0)
+            f.write(header.getvalue())
+
+    def append(self, zoning):
+        """
+        Adds `zoning` at the end
+        """
+        self.extend([zoning])
+
+    def appending(self, zonings):
+        """
+        Yields each of `zonings` after adding it at the end, so that
+        zonings are saved as they're made
+        """
+        for zoning in zonings:
+            self.append(zoning)
+            yield zoning
+
+
+def load_zonings(path):
+    """
+    Returns the zonings saved at `path`: a `ZoningStore` for a `.npy`
+    file, or a list of lists from a JSON file (like the older
+    `cached.json`)
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            return json.load(f)
+    return ZoningStore(path)